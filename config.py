@@ -10,7 +10,7 @@ SECRET = os.environ.get("SECRET")
 LIMIT = int(os.environ.get("LIMIT"))
 
 DB_HOST = os.environ.get("DB_HOST")
-DB_PORT = os.environ.get("DB_PORT")
+DB_PORT = os.environ.get("DB_PORT", "5432")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
@@ -22,4 +22,75 @@ IMAGE_PATH = os.environ.get("IMAGE_PATH")
 
 MOBIZON_API_KEY = os.environ.get("MOBIZON_API_KEY")
 
-RECAPTCHA_SECRET_KEY = os.environ.get("RECAPTCHA_SECRET_KEY")
\ No newline at end of file
+RECAPTCHA_SECRET_KEY = os.environ.get("RECAPTCHA_SECRET_KEY")
+
+CATEGORY_TREE_TTL = int(os.environ.get("CATEGORY_TREE_TTL", 60))
+
+APPROXIMATE_COUNT_THRESHOLD = int(os.environ.get("APPROXIMATE_COUNT_THRESHOLD", 10000))
+
+NOTIFICATION_TRANSPORT = os.environ.get("NOTIFICATION_TRANSPORT", "telegram")
+NOTIFICATION_BATCH_SIZE = int(os.environ.get("NOTIFICATION_BATCH_SIZE", 20))
+NOTIFICATION_POLL_INTERVAL = float(os.environ.get("NOTIFICATION_POLL_INTERVAL", 5))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATION_MAX_ATTEMPTS", 8))
+NOTIFICATION_RATE_PER_SECOND = float(os.environ.get("NOTIFICATION_RATE_PER_SECOND", 1))
+# seconds a claimed batch stays with its worker, longer than NOTIFICATION_BATCH_SIZE / NOTIFICATION_RATE_PER_SECOND
+NOTIFICATION_LEASE = float(os.environ.get("NOTIFICATION_LEASE", 120))
+
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 5))
+
+SMS_TRANSPORT = os.environ.get("SMS_TRANSPORT", "mobizon")
+SMS_QUEUE_SIZE = int(os.environ.get("SMS_QUEUE_SIZE", 1000))
+SMS_WORKERS = int(os.environ.get("SMS_WORKERS", 4))
+SMS_MAX_ATTEMPTS = int(os.environ.get("SMS_MAX_ATTEMPTS", 5))
+
+CAPTCHA_VERIFIER = os.environ.get("CAPTCHA_VERIFIER", "recaptcha")
+CAPTCHA_FAIL_OPEN = os.environ.get("CAPTCHA_FAIL_OPEN") == "True"
+CAPTCHA_TIMEOUT = float(os.environ.get("CAPTCHA_TIMEOUT", 3))
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 32))
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "True") == "True"
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 0))
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER") == "True"
+
+# comma separated host[:port] list of read replicas, empty sends all reads to the primary
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+DB_REPLICA_RETRY_AFTER = int(os.environ.get("DB_REPLICA_RETRY_AFTER", 30))
+# seconds after a catalog invalidation during which reads go to the primary, cover the replicas' worst lag
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+
+ENTITY_CACHE_SIZE = int(os.environ.get("ENTITY_CACHE_SIZE", 10000))
+ENTITY_CACHE_TTL = int(os.environ.get("ENTITY_CACHE_TTL", 300))
+
+# LISTEN needs a session level connection, point this at Postgres itself when DB_HOST is a pgbouncer
+DB_LISTEN_HOST = os.environ.get("DB_LISTEN_HOST", DB_HOST)
+DB_LISTEN_PORT = os.environ.get("DB_LISTEN_PORT", DB_PORT)
+INVALIDATION_RECONNECT_DELAY = float(os.environ.get("INVALIDATION_RECONNECT_DELAY", 5))
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 5000))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+RESPONSE_CACHE_MAX_BODY = int(os.environ.get("RESPONSE_CACHE_MAX_BODY", 1024 * 1024))
+# Cache-Control max-age for browsers and the front proxy, which can't be purged from here
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get("RESPONSE_CACHE_MAX_AGE", 30))
+
+CATALOG_QUERY_CACHE_SIZE = int(os.environ.get("CATALOG_QUERY_CACHE_SIZE", 2000))
+# name=fresh:stale seconds per catalog endpoint, e.g. "products=5:60,facets=30:600"
+CATALOG_CACHE_WINDOWS = {"products": (5, 60), "count": (30, 300), "price_range": (30, 300), "facets": (30, 300)}
+for window in os.environ.get("CATALOG_CACHE_WINDOWS", "").split(","):
+    if window.strip():
+        name, seconds = window.strip().split("=")
+        fresh, stale = seconds.split(":")
+        CATALOG_CACHE_WINDOWS[name] = (float(fresh), float(stale))
+
+# part of every ETag, bump it when a release changes what the catalog responses look like
+ETAG_VERSION = os.environ.get("ETAG_VERSION", "1")
@@ -0,0 +1,80 @@
+import sys
+
+from sqlalchemy import create_engine, text
+
+from sqlalchemy.orm import Session
+
+from models.base import DATABASE_URL
+
+# the join and lookup queries behind the catalog, cart and order endpoints,
+# run this before and after `alembic upgrade head` and compare the plans (see explain_plans/)
+QUERIES = {
+    "products of a category": """
+        SELECT product.* FROM product
+        JOIN product_categories ON product_categories.product_id = product.id
+        WHERE product_categories.category_id = (SELECT min(id) FROM category) AND product.visible
+        ORDER BY product_categories.id LIMIT 20
+    """,
+    "products of a tag": """
+        SELECT product.* FROM product
+        JOIN product_tags ON product_tags.product_id = product.id
+        WHERE product_tags.tag_id = (SELECT min(id) FROM tag) AND product.visible
+        ORDER BY product_tags.id LIMIT 20
+    """,
+    "categories of a product": """
+        SELECT category.* FROM category
+        JOIN product_categories ON product_categories.category_id = category.id
+        WHERE product_categories.product_id = (SELECT min(id) FROM product)
+    """,
+    "tags of a product": """
+        SELECT tag.* FROM tag
+        JOIN product_tags ON product_tags.tag_id = tag.id
+        WHERE product_tags.product_id = (SELECT min(id) FROM product)
+    """,
+    "visible products by price": """
+        SELECT * FROM product WHERE visible AND price BETWEEN 0 AND 5000 ORDER BY price LIMIT 20
+    """,
+    "children of a category": """
+        SELECT * FROM category WHERE parent_id = (SELECT min(id) FROM category)
+    """,
+    "categories of a heading": """
+        SELECT * FROM category WHERE heading_id = (SELECT min(id) FROM heading)
+    """,
+    "cart of a user": """
+        SELECT * FROM cart_product WHERE user_id = (SELECT min(id) FROM "user")
+    """,
+    "hydrated cart of a user": """
+        SELECT c.id, c.product_id, c.quantity, p.product_name, p.price, p.price * c.quantity AS line_total,
+               sum(p.price * c.quantity) OVER () AS cart_total
+        FROM cart_product c JOIN product p ON p.id = c.product_id
+        WHERE c.user_id = (SELECT min(id) FROM "user") ORDER BY c.id
+    """,
+    "active orders of a phone": """
+        SELECT * FROM "order" WHERE mobile_phone = (SELECT min(mobile_phone) FROM "order") AND active
+    """,
+    "latest orders": """
+        SELECT * FROM "order" ORDER BY created_at DESC LIMIT 20
+    """,
+    "products of an order": """
+        SELECT * FROM order_product WHERE order_id = (SELECT max(id) FROM "order")
+    """,
+}
+
+
+def explain(ses, name, query):
+    print(f"== {name}")
+    for row in ses.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}")):
+        print(row[0])
+    print()
+
+
+if __name__ == "__main__":
+    engine = create_engine(DATABASE_URL.replace("+asyncpg", ""))
+    session = Session(engine)
+
+    names = sys.argv[1:] or QUERIES.keys()
+    for name in names:
+        explain(session, name, QUERIES[name])
+
+    # EXPLAIN ANALYZE runs the statements, nothing here writes but don't leave the transaction open
+    session.rollback()
@@ -18,6 +18,14 @@ from routers.user.me import router as me_router
 
 
 from routers.admin.image import router as image_router
+from routers.admin.stats import router as stats_router
+
+from services.http import close_http_client
+from services.invalidation import invalidator
+from services.notifications import notification_dispatcher
+from services.passwords import password_hasher
+from services.response_cache import ResponseCacheMiddleware
+from services.sms import sms_queue
 
 if config.DEBUG == 'True':
     app = FastAPI(debug=True, reload=True)
@@ -31,6 +39,9 @@ origins = [
     "https:/thaihana.kz/"
 ]
 
+# added first so it sits inside CORS, which then sets its headers on cached responses too
+app.add_middleware(ResponseCacheMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -53,3 +64,20 @@ app.include_router(cart_product_router)
 app.include_router(order_router)
 
 app.include_router(image_router)
+app.include_router(stats_router)
+
+
+@app.on_event("startup")
+async def startup():
+    notification_dispatcher.start()
+    sms_queue.start()
+    invalidator.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await notification_dispatcher.stop()
+    await sms_queue.stop()
+    await invalidator.stop()
+    await close_http_client()
+    password_hasher.shutdown()
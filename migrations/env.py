@@ -13,6 +13,8 @@ from models.product import *
 from models.cart_product import *
 from models.order import *
 from models.heading import *
+from models.notification import *
+from models.catalog_version import *
 
 from models.base import Base
 
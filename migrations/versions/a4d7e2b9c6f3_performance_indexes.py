@@ -0,0 +1,58 @@
+"""performance indexes
+
+Revision ID: a4d7e2b9c6f3
+Revises: f2c9a7e4b1d8
+Create Date: 2026-10-18 14:21:47.902618
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2b9c6f3'
+down_revision = 'f2c9a7e4b1d8'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_product_categories_category_id_product_id', 'product_categories', ['category_id', 'product_id']),
+    ('ix_product_tags_tag_id_product_id', 'product_tags', ['tag_id', 'product_id']),
+    ('ix_cart_product_user_id', 'cart_product', ['user_id']),
+    ('ix_order_mobile_phone_active', 'order', ['mobile_phone', 'active']),
+    ('ix_order_created_at', 'order', ['created_at']),
+    ('ix_order_product_order_id', 'order_product', ['order_id']),
+    ('ix_category_parent_id', 'category', ['parent_id']),
+    ('ix_category_heading_id', 'category', ['heading_id']),
+    ('ix_product_visible_price', 'product', ['visible', 'price']),
+]
+
+UNIQUE_LINKS = [
+    ('uq_product_categories_product_id_category_id', 'product_categories', ['product_id', 'category_id']),
+    ('uq_product_tags_product_id_tag_id', 'product_tags', ['product_id', 'tag_id']),
+]
+
+
+def upgrade() -> None:
+    # keep the oldest row of every duplicated link, otherwise the unique indexes can't be built
+    op.execute('DELETE FROM product_categories a USING product_categories b '
+               'WHERE a.product_id = b.product_id AND a.category_id = b.category_id AND a.id > b.id')
+    op.execute('DELETE FROM product_tags a USING product_tags b '
+               'WHERE a.product_id = b.product_id AND a.tag_id = b.tag_id AND a.id > b.id')
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in UNIQUE_LINKS:
+            op.create_index(name, table, columns, unique=True, postgresql_concurrently=True, if_not_exists=True)
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    for name, table, columns in reversed(UNIQUE_LINKS):
+        op.drop_constraint(name, table, type_='unique')
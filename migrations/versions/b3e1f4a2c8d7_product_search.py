@@ -0,0 +1,49 @@
+"""product search
+
+Revision ID: b3e1f4a2c8d7
+Revises: 94c6d1ea249f
+Create Date: 2026-10-18 10:12:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e1f4a2c8d7'
+down_revision = '94c6d1ea249f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.add_column('product', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', coalesce(product_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(short_description, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(product_description, '')), 'C')",
+        persisted=True
+    ), nullable=True))
+    op.create_index('ix_product_search_vector', 'product', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+    op.create_index('ix_product_product_name_trgm', 'product', ['product_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'product_name': 'gin_trgm_ops'})
+    op.create_index('ix_category_category_name_trgm', 'category', ['category_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'category_name': 'gin_trgm_ops'})
+    op.create_index('ix_heading_heading_name_trgm', 'heading', ['heading_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'heading_name': 'gin_trgm_ops'})
+    op.create_index('ix_tag_tag_name_trgm', 'tag', ['tag_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'tag_name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tag_tag_name_trgm', table_name='tag')
+    op.drop_index('ix_heading_heading_name_trgm', table_name='heading')
+    op.drop_index('ix_category_category_name_trgm', table_name='category')
+    op.drop_index('ix_product_product_name_trgm', table_name='product')
+
+    op.drop_index('ix_product_search_vector', table_name='product')
+    op.drop_column('product', 'search_vector')
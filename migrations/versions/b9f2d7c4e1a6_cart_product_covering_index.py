@@ -0,0 +1,33 @@
+"""cart product covering index
+
+Revision ID: b9f2d7c4e1a6
+Revises: c8e3f6a1d9b2
+Create Date: 2026-10-18 17:05:36.740291
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9f2d7c4e1a6'
+down_revision = 'c8e3f6a1d9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_cart_product_user_id_covering', 'cart_product', ['user_id'], unique=False,
+                        postgresql_include=['id', 'product_id', 'quantity'], postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.drop_index('ix_cart_product_user_id', table_name='cart_product', postgresql_concurrently=True,
+                      if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_cart_product_user_id', 'cart_product', ['user_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_cart_product_user_id_covering', table_name='cart_product', postgresql_concurrently=True,
+                      if_exists=True)
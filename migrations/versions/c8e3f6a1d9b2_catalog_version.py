@@ -0,0 +1,32 @@
+"""catalog version
+
+Revision ID: c8e3f6a1d9b2
+Revises: a4d7e2b9c6f3
+Create Date: 2026-10-18 15:40:12.318564
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e3f6a1d9b2'
+down_revision = 'a4d7e2b9c6f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('catalog_version',
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('modified_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_version')
@@ -0,0 +1,31 @@
+"""keyset pagination indexes
+
+Revision ID: d5a8c2e9f1b4
+Revises: b3e1f4a2c8d7
+Create Date: 2026-10-18 11:04:27.561930
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c2e9f1b4'
+down_revision = 'b3e1f4a2c8d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_product_price_id', 'product', ['price', 'id'], unique=False)
+    op.create_index('ix_product_product_name_id', 'product', ['product_name', 'id'], unique=False)
+    op.create_index('ix_category_category_name_id', 'category', ['category_name', 'id'], unique=False)
+    op.create_index('ix_heading_heading_name_id', 'heading', ['heading_name', 'id'], unique=False)
+    op.create_index('ix_tag_tag_name_id', 'tag', ['tag_name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tag_tag_name_id', table_name='tag')
+    op.drop_index('ix_heading_heading_name_id', table_name='heading')
+    op.drop_index('ix_category_category_name_id', table_name='category')
+    op.drop_index('ix_product_product_name_id', table_name='product')
+    op.drop_index('ix_product_price_id', table_name='product')
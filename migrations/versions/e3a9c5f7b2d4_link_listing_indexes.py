@@ -0,0 +1,40 @@
+"""link listing indexes
+
+Revision ID: e3a9c5f7b2d4
+Revises: b9f2d7c4e1a6
+Create Date: 2026-10-18 18:12:03.518207
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a9c5f7b2d4'
+down_revision = 'b9f2d7c4e1a6'
+branch_labels = None
+depends_on = None
+
+# the category and tag listings order by link id, (category_id, product_id) couldn't serve that
+INDEXES = [
+    ('ix_product_categories_category_id_id', 'product_categories', ['category_id', 'id'],
+     'ix_product_categories_category_id_product_id', ['category_id', 'product_id']),
+    ('ix_product_tags_tag_id_id', 'product_tags', ['tag_id', 'id'],
+     'ix_product_tags_tag_id_product_id', ['tag_id', 'product_id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, old_name, old_columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_include=['product_id'],
+                            postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(old_name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, old_name, old_columns in reversed(INDEXES):
+            op.create_index(old_name, table, old_columns, unique=False, postgresql_concurrently=True,
+                            if_not_exists=True)
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""order number counter
+
+Revision ID: e7b4d1c6a3f9
+Revises: d5a8c2e9f1b4
+Create Date: 2026-10-18 12:21:53.804117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b4d1c6a3f9'
+down_revision = 'd5a8c2e9f1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('order_number_counter',
+    sa.Column('day', sa.String(length=8), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('modified_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day')
+    )
+
+    # continue numbering from the orders that already exist
+    op.execute("""
+        INSERT INTO order_number_counter (day, value)
+        SELECT substr(order_number, 1, 8), max(substr(order_number, 9)::integer)
+        FROM "order"
+        GROUP BY substr(order_number, 1, 8)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('order_number_counter')
@@ -0,0 +1,40 @@
+"""notification outbox
+
+Revision ID: f2c9a7e4b1d8
+Revises: e7b4d1c6a3f9
+Create Date: 2026-10-18 13:02:15.447390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c9a7e4b1d8'
+down_revision = 'e7b4d1c6a3f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('notification_outbox',
+    sa.Column('channel', sa.String(length=32), nullable=False),
+    sa.Column('payload', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('sent_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('failed', sa.Boolean(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('modified_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_outbox_pending', 'notification_outbox', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text('sent_at IS NULL AND NOT failed'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_outbox_pending', table_name='notification_outbox',
+                  postgresql_where=sa.text('sent_at IS NULL AND NOT failed'))
+    op.drop_table('notification_outbox')
@@ -1,28 +1,194 @@
+import asyncio
+import itertools
+import time
 from datetime import datetime
+from uuid import uuid4
 
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, Integer, TIMESTAMP
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import Column, Integer, TIMESTAMP, event
+from sqlalchemy.exc import DBAPIError
 
-from config import DB_HOST, DB_NAME, DB_PASS, DB_USER
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, \
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_STATEMENT_TIMEOUT, DB_PGBOUNCER, \
+    DB_REPLICA_HOSTS, DB_REPLICA_RETRY_AFTER, DB_REPLICA_MAX_LAG
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 
 class Base(DeclarativeBase):
     id = Column(Integer, primary_key=True)
 
-    created_at = Column(TIMESTAMP, default=datetime.utcnow())
-    modified_at = Column(TIMESTAMP, default=datetime.utcnow())
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    modified_at = Column(TIMESTAMP, default=datetime.utcnow)
 
 
-engine = create_async_engine(DATABASE_URL)
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.wait_seconds += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long getting a connection takes (waiting or connecting)."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - started_at)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options() -> dict:
+    connect_args = {}
+
+    if DB_PGBOUNCER:
+        # transaction pooling hands every transaction a different server connection,
+        # so no statement may be prepared under a reusable name
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    else:
+        connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+
+        # pgbouncer rejects unknown startup parameters, set the timeout on the role there instead
+        if DB_STATEMENT_TIMEOUT:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def create_engine_with_stats(url: str):
+    engine = create_async_engine(url, **engine_options())
+    engine.pool.stats = PoolStats()
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        engine.pool.stats.checkouts += 1
+
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = pool.stats
+
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts": stats.checkouts,
+        "wait_seconds_avg": stats.wait_seconds / stats.waits if stats.waits else 0,
+        "wait_seconds_max": stats.wait_seconds_max,
+    }
+
+
+class Replica:
+    def __init__(self, host: str):
+        if ":" not in host:
+            host = f"{host}:{DB_PORT}"
+
+        self.host = host
+        self.engine = create_engine_with_stats(f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{host}/{DB_NAME}")
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.down_until = 0.0
+
+    def is_healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+
+class ReplicaSet:
+    """Round robin over the read replicas, one that failed to connect is skipped for retry_after seconds."""
+
+    def __init__(self, hosts: List[str], retry_after: int, max_lag: float):
+        self.replicas = [Replica(host) for host in hosts]
+        self.retry_after = retry_after
+        self.max_lag = max_lag
+
+        self._counter = itertools.count()
+        self._primary_until = 0.0
+
+    def avoid_for_max_lag(self):
+        """Sends reads to the primary until the replicas have surely replayed a write that just committed.
+
+        Called on every cache invalidation, the caches are refilled right after it and must not
+        get rows from before the write (they'd be kept under the new catalog version).
+        """
+        self._primary_until = time.monotonic() + self.max_lag
+
+    def pick(self) -> Optional[Replica]:
+        if self._primary_until > time.monotonic():
+            return None
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._counter) % len(self.replicas)]
+            if replica.is_healthy():
+                return replica
+
+        return None
+
+    def mark_down(self, replica: Replica):
+        replica.down_until = time.monotonic() + self.retry_after
+
+    def stats(self) -> list:
+        return [{"host": replica.host, "healthy": replica.is_healthy(), **pool_stats(replica.engine)}
+                for replica in self.replicas]
+
+
+engine = create_engine_with_stats(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+replicas = ReplicaSet(DB_REPLICA_HOSTS, DB_REPLICA_RETRY_AFTER, DB_REPLICA_MAX_LAG)
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+
+async def open_read_session() -> AsyncSession:
+    """Session on a healthy replica, or on the primary when there is none (or a write was just invalidated)."""
+    while True:
+        replica = replicas.pick()
+        if replica is None:
+            return async_session_maker()
+
+        session = replica.session_maker()
+        try:
+            await session.connection()
+            return session
+        except (OSError, asyncio.TimeoutError, DBAPIError):
+            await session.close()
+            replicas.mark_down(replica)
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """For read only GET routes that don't need to see a write made just before."""
+    async with await open_read_session() as session:
+        yield session
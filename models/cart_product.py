@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Integer, Index
 
 from models.base import Base
 from models.product import Product
@@ -12,8 +12,7 @@ class CartProduct(Base):
     product_id = Column(ForeignKey(Product.id), nullable=False)
     quantity = Column(Integer, nullable=False)
 
-
-
-
-
-
+    __table_args__ = (
+        # covers the cart reads, they only need these columns of the user's rows
+        Index("ix_cart_product_user_id_covering", "user_id", postgresql_include=["id", "product_id", "quantity"]),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, BigInteger
+
+from models.base import Base
+
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+
+    kind = Column(String(length=32), nullable=False, unique=True)
+    version = Column(BigInteger, nullable=False)
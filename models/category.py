@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey
+from sqlalchemy import Column, String, Boolean, ForeignKey, Index
 
 from models.base import Base
 from models.heading import Heading
@@ -18,7 +18,10 @@ class Category(Base):
 
     category_description = Column(String, nullable=False)
 
-
-
-
-
+    __table_args__ = (
+        Index("ix_category_category_name_trgm", "category_name", postgresql_using="gin",
+              postgresql_ops={"category_name": "gin_trgm_ops"}),
+        Index("ix_category_category_name_id", "category_name", "id"),
+        Index("ix_category_parent_id", "parent_id"),
+        Index("ix_category_heading_id", "heading_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import Column, String, Boolean, Index
 
 from models.base import Base
 
@@ -14,7 +14,8 @@ class Heading(Base):
 
     heading_description = Column(String, nullable=False)
 
-
-
-
-
+    __table_args__ = (
+        Index("ix_heading_heading_name_trgm", "heading_name", postgresql_using="gin",
+              postgresql_ops={"heading_name": "gin_trgm_ops"}),
+        Index("ix_heading_heading_name_id", "heading_name", "id"),
+    )
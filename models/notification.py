@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, Boolean, TIMESTAMP, Index, text
+
+from models.base import Base
+
+
+class Notification(Base):
+    __tablename__ = "notification_outbox"
+
+    channel = Column(String(length=32), nullable=False, default="telegram")
+    payload = Column(String, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+    sent_at = Column(TIMESTAMP, nullable=True)
+    failed = Column(Boolean, nullable=False, default=False)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_pending", "next_attempt_at",
+              postgresql_where=text("sent_at IS NULL AND NOT failed")),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, Integer, Boolean
+from sqlalchemy import Column, String, ForeignKey, Integer, Boolean, Index
 
 from models.base import Base
 from models.product import Product
@@ -15,6 +15,11 @@ class Order(Base):
     user_id = Column(ForeignKey(User.id), nullable=True)
     mobile_phone = Column(String(length=128), nullable=False)
 
+    __table_args__ = (
+        Index("ix_order_mobile_phone_active", "mobile_phone", "active"),
+        Index("ix_order_created_at", "created_at"),
+    )
+
 
 class OrderProduct(Base):
     __tablename__ = "order_product"
@@ -23,5 +28,13 @@ class OrderProduct(Base):
     product_id = Column(ForeignKey(Product.id), nullable=False)
     quantity = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index("ix_order_product_order_id", "order_id"),
+    )
+
 
+class OrderNumberCounter(Base):
+    __tablename__ = "order_number_counter"
 
+    day = Column(String(length=8), nullable=False, unique=True)
+    value = Column(Integer, nullable=False)
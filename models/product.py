@@ -1,10 +1,15 @@
-from sqlalchemy import Column, String, Integer, Numeric, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, Numeric, Boolean, ForeignKey, Computed, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 
 from models.base import Base
 
 from models.category import Category
 from models.tag import Tag
 
+# text search configuration of product.search_vector, has to match the migration
+SEARCH_CONFIG = "simple"
+
 
 class Product(Base):
     __tablename__ = "product"
@@ -16,13 +21,30 @@ class Product(Base):
     image_path = Column(String, nullable=False)
 
     short_description = Column(String(256), nullable=False)
-    product_description = Column(String, nullable=False)
+    # unbounded, ORM loads of Product leave it out unless asked for with undefer()
+    product_description = deferred(Column(String, nullable=False))
 
     price = Column(Numeric, nullable=False)
     quantity = Column(Integer, nullable=False)
     measure = Column(String, default="gr", nullable=False)
     product_weight = Column(Numeric, nullable=False)
 
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(product_name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(short_description, '')), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(product_description, '')), 'C')",
+        persisted=True
+    )))
+
+    __table_args__ = (
+        Index("ix_product_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_product_product_name_trgm", "product_name", postgresql_using="gin",
+              postgresql_ops={"product_name": "gin_trgm_ops"}),
+        Index("ix_product_price_id", "price", "id"),
+        Index("ix_product_product_name_id", "product_name", "id"),
+        Index("ix_product_visible_price", "visible", "price"),
+    )
+
 
 class ProductCategories(Base):
     __tablename__ = "product_categories"
@@ -30,9 +52,20 @@ class ProductCategories(Base):
     category_id = Column(ForeignKey(Category.id), nullable=False)
     product_id = Column(ForeignKey(Product.id), nullable=False)
 
+    __table_args__ = (
+        UniqueConstraint("product_id", "category_id", name="uq_product_categories_product_id_category_id"),
+        # category listings page by link id, the filters only read product_id from it
+        Index("ix_product_categories_category_id_id", "category_id", "id", postgresql_include=["product_id"]),
+    )
+
 
 class ProductTags(Base):
     __tablename__ = "product_tags"
 
     tag_id = Column(ForeignKey(Tag.id), nullable=False)
-    product_id = Column(ForeignKey(Product.id), nullable=False)
\ No newline at end of file
+    product_id = Column(ForeignKey(Product.id), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "tag_id", name="uq_product_tags_product_id_tag_id"),
+        Index("ix_product_tags_tag_id_id", "tag_id", "id", postgresql_include=["product_id"]),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Index
 
 from models.base import Base
 
@@ -10,8 +10,8 @@ class Tag(Base):
     tag_slug = Column(String(length=128), nullable=False, unique=True)
     image_path = Column(String, nullable=False)
 
-
-
-
-
-
+    __table_args__ = (
+        Index("ix_tag_tag_name_trgm", "tag_name", postgresql_using="gin",
+              postgresql_ops={"tag_name": "gin_trgm_ops"}),
+        Index("ix_tag_tag_name_id", "tag_name", "id"),
+    )
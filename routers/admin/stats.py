@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Depends
+
+from models.base import engine, pool_stats, replicas
+from models.user import User
+from routers.auth.auth_bearer import JWTBearer
+from services.passwords import password_hasher
+
+router = APIRouter(
+    prefix="/stats",
+    tags=['stats']
+)
+
+
+@router.get("/")
+async def get_stats(user: User = Depends(JWTBearer())):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return {
+        "database": pool_stats(engine),
+        "replicas": replicas.stats(),
+        "password_hashing": password_hasher.metrics()
+    }
@@ -3,10 +3,32 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
 from models.base import get_async_session
 from models.user import User
+from schemas.user import UserAuthenticated
+from services.cache import TTLCache
+from services.invalidation import invalidator
 from .auth_handler import decodeJWT
 
+# resolved users (UserAuthenticated) by token subject (mobile phone), saves a query on every authenticated request
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def _drop_users(*mobile_phones: str):
+    if not mobile_phones:
+        user_cache.clear()
+    for mobile_phone in mobile_phones:
+        user_cache.delete(mobile_phone)
+
+
+invalidator.subscribe("user", _drop_users)
+
+
+async def invalidate_user(session: AsyncSession, mobile_phone: str):
+    """Drops the cached user on every worker, call it in the transaction that changes the user."""
+    await invalidator.publish(session, "user", mobile_phone)
+
 
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
@@ -17,24 +39,39 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-            if not self.verify_jwt(credentials.credentials):
+
+            token = self.decode_jwt(credentials.credentials)
+            if token is None:
                 raise HTTPException(status_code=403, detail="Invalid token or expired token.")
 
-            token = decodeJWT(credentials.credentials)
-            query = select(User).where(User.mobile_phone == token["mobile_phone"])
-            result = (await session.execute(query)).first()[0]
+            mobile_phone = token["mobile_phone"]
+            user = user_cache.get(mobile_phone)
+            if user is None:
+                query = select(User).where(User.mobile_phone == mobile_phone)
+                existing_user = (await session.execute(query)).scalar()
+                if existing_user is None:
+                    raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+
+                # not the ORM object, that one stays bound to this request's session
+                user = UserAuthenticated(
+                    id=existing_user.id,
+                    mobile_phone=existing_user.mobile_phone,
+                    first_name=existing_user.first_name,
+                    last_name=existing_user.last_name,
+                    is_verified=bool(existing_user.is_verified),
+                    is_superuser=bool(existing_user.is_superuser)
+                )
+                user_cache.set(mobile_phone, user)
 
-            return result
+            return user
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    def verify_jwt(self, jwtoken: str) -> bool:
-        isTokenValid: bool = False
-
+    def decode_jwt(self, jwtoken: str):
         try:
-            payload = decodeJWT(jwtoken)
+            return decodeJWT(jwtoken)
         except:
-            payload = None
-        if payload:
-            isTokenValid = True
-        return isTokenValid
\ No newline at end of file
+            return None
+
+    def verify_jwt(self, jwtoken: str) -> bool:
+        return self.decode_jwt(jwtoken) is not None
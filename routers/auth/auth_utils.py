@@ -1,10 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import phonenumbers
-import requests
 from fastapi import HTTPException
 
-from config import RECAPTCHA_SECRET_KEY
+from services.captcha import captcha_verifier
+
+OTP_LIFETIME = timedelta(minutes=10)
 
 
 def is_phone_number_valid(phone_number: str):
@@ -21,19 +22,10 @@ def is_otp_expired(otp_expires: datetime):
     return otp_expires < datetime.utcnow()
 
 
-def verify_captcha(host, captcha: str):
-    url = "https://www.google.com/recaptcha/api/siteverify"
-    params = {
-        'secret': RECAPTCHA_SECRET_KEY,
-        'response': captcha,
-        'remoteip': host
-    }
-
-    verify_rs = requests.get(url, params=params, verify=True)
-    verify_rs = verify_rs.json()
-    status = verify_rs.get("success", False)
+def has_pending_otp(user) -> bool:
+    """A code was sent to this number and can still be used."""
+    return user.otp is not None and user.otp_expires is not None and not is_otp_expired(user.otp_expires)
 
-    if not status:
-        raise HTTPException(status_code=400, detail="Captcha Validation Failed!")
 
-    return status
+async def verify_captcha(host, captcha: str) -> bool:
+    return await captcha_verifier.verify(host, captcha)
@@ -1,6 +1,6 @@
-import bcrypt
+import asyncio
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from fastapi import APIRouter, Body, HTTPException, Depends, Request
 from sqlalchemy import select, update
@@ -8,9 +8,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import get_async_session
 from models.user import User
+from routers.auth.auth_bearer import invalidate_user
 from schemas.user import UserPreRegisterSchema, UserResetPasswordSchema
-from utils import send_otp
-from .auth_utils import is_phone_number_valid, is_otp_expired, verify_captcha
+from services.passwords import password_hasher
+from services.sms import send_otp
+from .auth_utils import is_phone_number_valid, is_otp_expired, has_pending_otp, verify_captcha, \
+    OTP_LIFETIME
 
 router = APIRouter(
     prefix="/auth",
@@ -23,30 +26,36 @@ async def forgot_password(request: Request, user: UserPreRegisterSchema = Body(.
 
     is_phone_number_valid(user.mobile_phone)
 
+    # the captcha round trip to google overlaps with the user lookup
     query = select(User).where(User.mobile_phone == user.mobile_phone)
-    existing_user = (await session.execute(query)).first()
+    result, status = await asyncio.gather(session.execute(query),
+                                          verify_captcha(request.client.host, user.captcha))
+    existing_user = result.first()
 
     if existing_user is None or not existing_user[0].is_verified:
         raise HTTPException(status_code=400, detail="User doesn't exist!")
 
-    status = verify_captcha(request.client.host, user.captcha)
-
     if not status:
         raise HTTPException(status_code=400, detail="Captcha Validation Failed!")
 
+    # the code already sent is still valid, asking again must not send (and pay for) another SMS
+    if has_pending_otp(existing_user[0]):
+        return {"status": "success"}
+
     user_dict = user.dict()
 
     user_dict.pop("captcha")
 
     otp = random.randint(100000, 999999)
     user_dict["otp"] = otp
-    user_dict["otp_expires"] = datetime.utcnow() + timedelta(minutes=10)
-
-    send_otp(user.mobile_phone.replace("+", ""), otp)
+    user_dict["otp_expires"] = datetime.utcnow() + OTP_LIFETIME
 
     statement = update(User).where(User.mobile_phone == user.mobile_phone).values(**user_dict)
 
     await session.execute(statement)
+
+    # queued before the commit, a full queue (503) must not leave a code behind that was never sent
+    send_otp(user.mobile_phone.replace("+", ""), otp)
     await session.commit()
 
     return {"status": "success"}
@@ -69,13 +78,14 @@ async def reset_password(user: UserResetPasswordSchema = Body(...), session: Asy
     if existing_user[0].otp != user.otp:
         raise HTTPException(status_code=400, detail="OTP is wrong!")
 
-    salt = bcrypt.gensalt()
-    byte_password = user.new_password.encode('utf-8')
-    new_hashed_password = bcrypt.hashpw(byte_password, salt).decode('utf-8')
+    new_hashed_password = await password_hasher.hash(user.new_password)
 
-    statement = update(User).where(User.mobile_phone == user.mobile_phone).values(hashed_password=new_hashed_password)
+    # a used code is spent, the next forgot_password sends a fresh one
+    statement = update(User).where(User.mobile_phone == user.mobile_phone).values(hashed_password=new_hashed_password,
+                                                                                  otp=None)
 
     await session.execute(statement)
+    await invalidate_user(session, user.mobile_phone)
     await session.commit()
 
     return {"status": "success"}
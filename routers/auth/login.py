@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Body, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import get_async_session
 from models.user import User
+from routers.auth.auth_bearer import invalidate_user
 from routers.auth.auth_handler import signJWT
 from schemas.user import UserLoginSchema
-
-import bcrypt
+from services.passwords import password_hasher
 
 router = APIRouter(
     prefix="/auth",
@@ -24,9 +24,15 @@ async def login(user: UserLoginSchema = Body(...), session: AsyncSession = Depen
     if existing_user is None:
         raise HTTPException(status_code=400, detail="Incorrect login or password!")
 
-    byte_password = user.password.encode('utf-8')
-
-    if not bcrypt.checkpw(byte_password, existing_user[0].hashed_password.encode('utf-8')):
+    if not await password_hasher.verify(user.password, existing_user[0].hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect login or password!")
 
+    # hashed with a different cost factor, upgrade it while the plain password is at hand
+    if password_hasher.needs_rehash(existing_user[0].hashed_password):
+        hashed_password = await password_hasher.hash(user.password)
+        statement = update(User).where(User.id == existing_user[0].id).values(hashed_password=hashed_password)
+        await session.execute(statement)
+        await invalidate_user(session, user.mobile_phone)
+        await session.commit()
+
     return signJWT(user.mobile_phone)
@@ -1,5 +1,6 @@
+import asyncio
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from fastapi import APIRouter, Body, HTTPException, Depends, Request
 from sqlalchemy import select, insert, update
@@ -8,8 +9,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from models.base import get_async_session
 from models.user import User
 from schemas.user import UserPreRegisterSchema, UserOtpCheckSchema
-from utils import send_otp
-from .auth_utils import is_phone_number_valid, is_otp_expired, verify_captcha
+from services.sms import send_otp
+from .auth_utils import is_phone_number_valid, is_otp_expired, has_pending_otp, verify_captcha, \
+    OTP_LIFETIME
 
 router = APIRouter(
     prefix="/auth",
@@ -22,17 +24,22 @@ async def preregister(request: Request, user: UserPreRegisterSchema = Body(...),
                       session: AsyncSession = Depends(get_async_session)):
     is_phone_number_valid(user.mobile_phone)
 
+    # the captcha round trip to google overlaps with the user lookup
     query = select(User).where(User.mobile_phone == user.mobile_phone)
-    existing_user = (await session.execute(query)).first()
+    result, status = await asyncio.gather(session.execute(query),
+                                          verify_captcha(request.client.host, user.captcha))
+    existing_user = result.first()
 
     if existing_user is not None and existing_user[0].is_verified:
         raise HTTPException(status_code=400, detail="User already exists!")
 
-    status = verify_captcha(request.client.host, user.captcha)
-
     if not status:
         raise HTTPException(status_code=400, detail="Captcha Validation Failed!")
 
+    # the code already sent is still valid, asking again must not send (and pay for) another SMS
+    if existing_user is not None and has_pending_otp(existing_user[0]):
+        return {"status": "success"}
+
     user_dict = user.dict()
 
     user_dict.pop("captcha")
@@ -43,9 +50,7 @@ async def preregister(request: Request, user: UserPreRegisterSchema = Body(...),
 
     otp = random.randint(100000, 999999)
     user_dict["otp"] = otp
-    user_dict["otp_expires"] = datetime.utcnow() + timedelta(minutes=10)
-
-    send_otp(user.mobile_phone.replace("+", ""), otp)
+    user_dict["otp_expires"] = datetime.utcnow() + OTP_LIFETIME
 
     statement = insert(User).values(**user_dict)
 
@@ -53,6 +58,9 @@ async def preregister(request: Request, user: UserPreRegisterSchema = Body(...),
         statement = update(User).where(User.mobile_phone == user.mobile_phone).values(**user_dict)
 
     await session.execute(statement)
+
+    # queued before the commit, a full queue (503) must not leave a code behind that was never sent
+    send_otp(user.mobile_phone.replace("+", ""), otp)
     await session.commit()
 
     return {"status": "success"}
@@ -1,12 +1,13 @@
-import bcrypt
 from fastapi import APIRouter, Body, HTTPException, Depends
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import get_async_session
 from models.user import User
+from routers.auth.auth_bearer import invalidate_user
 from routers.auth.auth_handler import signJWT
 from schemas.user import UserRegisterSchema
+from services.passwords import password_hasher
 from .auth_utils import is_phone_number_valid, is_otp_expired
 
 router = APIRouter(
@@ -40,13 +41,12 @@ async def register(user: UserRegisterSchema = Body(...), session: AsyncSession =
     user_dict.pop("mobile_phone")
     user_dict["is_verified"] = True
 
-    salt = bcrypt.gensalt()
     password = user_dict.pop("password")
-    byte_password = password.encode('utf-8')
-    user_dict["hashed_password"] = bcrypt.hashpw(byte_password, salt).decode('utf-8')
+    user_dict["hashed_password"] = await password_hasher.hash(password)
 
-    statement = update(User).values(**user_dict)
+    statement = update(User).where(User.mobile_phone == user.mobile_phone).values(**user_dict)
     await session.execute(statement)
+    await invalidate_user(session, user.mobile_phone)
     await session.commit()
 
     return signJWT(user.mobile_phone)
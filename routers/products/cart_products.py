@@ -1,13 +1,17 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, Body
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, insert, delete, update
+from sqlalchemy import select, insert, delete, update, case, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import get_async_session
 from models.cart_product import CartProduct
+from models.product import Product
 from models.user import User
 from routers.auth.auth_bearer import JWTBearer
-from schemas.cart_product import CartProductUpdate
+from schemas.cart_product import CartProductUpdate, CartProductRead, CartRead
+from services.json_response import FastJSONResponse
+from utils import columns_for, get_list_from_result
 
 router = APIRouter(
     prefix="/cart",
@@ -49,14 +53,43 @@ async def update_cart_product(cart_product_id: int,
     return {"status": "success"}
 
 
-@router.get("/all")
+@router.get("/all", response_model=List[CartProductRead], response_class=FastJSONResponse)
 async def get_all_cart_product(user: User = Depends(JWTBearer()),
                                session: AsyncSession = Depends(get_async_session)):
-    query = select(CartProduct).where(CartProduct.user_id == user.id)
+    query = select(*columns_for(CartProduct, CartProductRead)).where(CartProduct.user_id == user.id)
     result = await session.execute(query)
 
-    list = []
-    for key, category in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(category[0]))
+    return FastJSONResponse(get_list_from_result(result))
+
+
+@router.get("/hydrated", response_model=CartRead, response_class=FastJSONResponse)
+async def get_hydrated_cart(user: User = Depends(JWTBearer()),
+                            session: AsyncSession = Depends(get_async_session)):
+    """Cart lines joined with their products, line totals and the cart total come from the same query."""
+    status = case(
+        (Product.visible.is_not(True), "hidden"),
+        (Product.quantity <= 0, "out_of_stock"),
+        (Product.quantity < CartProduct.quantity, "low_stock"),
+        else_="available"
+    )
+    line_total = Product.price * CartProduct.quantity
+    # lines that can be ordered, available or low_stock
+    orderable_total = case((and_(Product.visible.is_(True), Product.quantity > 0), line_total), else_=0)
+
+    query = select(CartProduct.id, CartProduct.product_id, CartProduct.quantity,
+                   Product.product_name, Product.product_slug, Product.image_path, Product.price, Product.measure,
+                   Product.product_weight,
+                   status.label("status"), line_total.label("line_total"),
+                   func.sum(orderable_total).over().label("cart_total")) \
+        .join(Product, Product.id == CartProduct.product_id) \
+        .where(CartProduct.user_id == user.id) \
+        .order_by(CartProduct.id)
+    result = await session.execute(query)
+
+    list = get_list_from_result(result)
+
+    total = list[0]["cart_total"] if list else 0
+    for line in list:
+        del line["cart_total"]
 
-    return list
+    return FastJSONResponse({"items": list, "total": total})
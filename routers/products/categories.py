@@ -1,62 +1,100 @@
 from datetime import datetime
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, Request, HTTPException, Body, Query
 from fastapi.encoders import jsonable_encoder
 
 from routers.auth.auth_bearer import JWTBearer
-from utils import to_slug
-from sqlalchemy import select, insert, update, delete, func
+from utils import to_slug, columns_for, get_list_from_result
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import LIMIT
-from models.base import get_async_session
+from models.base import get_async_session, get_read_session
 from models.category import Category
 from models.product import ProductCategories
 from models.user import User
-from routers.products.products import get_product_by_slug
-from schemas.category import CategoryUpdate
+from routers.products.entity_cache import category_cache
+from routers.products.filters import search_by_name
+from routers.products.pagination import sort_keys, paginate, page_response, order_by_sort
+from routers.products.products import get_product_id_by_slug
+from schemas.category import CategoryUpdate, CategoryRead
+from schemas.page import Page
+from services.invalidation import invalidator
+from services.json_response import FastJSONResponse
+from services.response_cache import add_surrogate_keys, set_last_modified
 
 router = APIRouter(
     prefix="/categories",
     tags=['categories']
 )
 
+CATEGORY_COLUMNS = columns_for(Category, CategoryRead)
+CATEGORY_SORT_KEYS = sort_keys(Category.id, category_name=Category.category_name)
+
 
 @router.get("/id/{category_id}")
-async def get_category_by_id(category_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Category).where(Category.id == category_id)
-    result = await session.execute(query)
-    end = result.first()
+async def get_category_by_id(category_id: int, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        query = select(*CATEGORY_COLUMNS).where(Category.id == category_id)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
 
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+    category = await category_cache.get_by_id(category_id, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("categories" if category is None else f"category-{category['id']}")
+    if category is not None:
+        set_last_modified(category["modified_at"])
+    return category
 
 
 @router.get("/{category_slug}")
-async def get_category_by_slug(category_slug: str, session: AsyncSession = Depends(get_async_session)):
-    query = select(Category).where(Category.category_slug == category_slug)
-    result = await session.execute(query)
-    end = result.first()
+async def get_category_by_slug(category_slug: str, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        query = select(*CATEGORY_COLUMNS).where(Category.category_slug == category_slug)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
+
+    category = await category_cache.get_by_slug(category_slug, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("categories" if category is None else f"category-{category['id']}")
+    if category is not None:
+        set_last_modified(category["modified_at"])
+    return category
+
+
+@router.get("", response_model=Union[Page[CategoryRead], List[CategoryRead]], response_class=FastJSONResponse)
+async def get_category_all(limit: int, offset: Optional[int] = None, after: Optional[str] = None, sort: str = "id",
+                           search_query: str = Query(default=""), session: AsyncSession = Depends(get_read_session)):
+    if limit > LIMIT:
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+    add_surrogate_keys("categories")
 
+    query = select(*CATEGORY_COLUMNS).where(Category.visible)
+    query = search_by_name(query, Category.category_name, search_query)
 
-@router.get("")
-async def get_category_all(offset: int, limit: int, search_query: str = Query(default=""), session: AsyncSession = Depends(get_async_session)):
-    if limit > LIMIT:
-        raise HTTPException(status_code=403, detail="Forbidden")
+    if offset is not None:
+        query = order_by_sort(query, CATEGORY_SORT_KEYS, sort, Category.id).offset(offset).limit(limit)
+    else:
+        query = paginate(query, CATEGORY_SORT_KEYS, sort, after, limit, Category.id, search_query)
 
-    query = select(Category).where(Category.visible).offset(offset).limit(limit).where(func.lower(Category.category_name).contains(search_query.lower()))
     result = await session.execute(query)
 
-    list = []
-    for key, category in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(category[0]))
+    list = get_list_from_result(result)
 
-    return list
+    if offset is not None:
+        return FastJSONResponse(list)
+    return FastJSONResponse(page_response(list, CATEGORY_SORT_KEYS, sort, limit))
 
 
 @router.post("/create")
@@ -74,8 +112,9 @@ async def create_category(request: Request,
     if len(result) != 0:
         return {"status": "failure", "detail": "slug is already exists"}
 
-    statement = insert(Category).values(**new_category.dict(), category_slug=slug)
-    await session.execute(statement)
+    statement = insert(Category).values(**new_category.dict(), category_slug=slug).returning(Category.id)
+    category_id = (await session.execute(statement)).scalar_one()
+    await invalidator.publish(session, "category", category_id)
     await session.commit()
 
     return {"status": "success"}
@@ -110,6 +149,7 @@ async def update_category_by_id(request: Request,
                                                                           created_at=result[0].created_at,
                                                                           modified_at=datetime.utcnow())
     await session.execute(statement)
+    await invalidator.publish(session, "category", category_id)
     await session.commit()
 
     return {"status": "success"}
@@ -140,11 +180,13 @@ async def add_category_to_product(request: Request,
     if not user.is_superuser:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    statement = insert(ProductCategories).values({
+    # adding an existing link again is a no-op instead of a duplicate row
+    statement = pg_insert(ProductCategories).values({
         "category_id": category_id,
         "product_id": product_id
-    })
+    }).on_conflict_do_nothing(index_elements=["product_id", "category_id"])
     await session.execute(statement)
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -160,9 +202,11 @@ async def add_category_to_product_by_slug(request: Request,
         raise HTTPException(status_code=403, detail="Forbidden")
 
     category = await get_category_by_slug(category_slug, session)
-    product = await get_product_by_slug(product_slug, session)
+    if category is None:
+        raise HTTPException(status_code=400, detail="Category doesn't exist!")
+    product_id = await get_product_id_by_slug(product_slug, session)
 
-    return await add_category_to_product(request, product["id"], category["id"], user, session)
+    return await add_category_to_product(request, product_id, category["id"], user, session)
 
 
 @router.delete("/id/{product_id}/remove/{category_id}")
@@ -178,6 +222,7 @@ async def remove_category_from_product_by_id(request: Request,
         ProductCategories.category_id == category_id and
         ProductCategories.product_id == product_id)
     await session.execute(statement)
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -193,6 +238,8 @@ async def remove_category_to_product_by_slug(request: Request,
         raise HTTPException(status_code=403, detail="Forbidden")
 
     category = await get_category_by_slug(category_slug, session)
-    product = await get_product_by_slug(product_slug, session)
+    if category is None:
+        raise HTTPException(status_code=400, detail="Category doesn't exist!")
+    product_id = await get_product_id_by_slug(product_slug, session)
 
-    return await remove_category_from_product_by_id(request, product["id"], category["id"], user, session)
+    return await remove_category_from_product_by_id(request, product_id, category["id"], user, session)
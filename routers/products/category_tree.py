@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from config import CATEGORY_TREE_TTL
+from models.base import open_read_session
+from models.category import Category
+
+
+class CategoryTree:
+    """In-process parent -> children index of the whole category table.
+
+    Loaded with a single query (on its own session, so requests that find it
+    fresh don't need a connection) on first use, rebuilt after invalidate() or
+    once the ttl runs out.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+        self._children: Dict[int, List[int]] = {}
+        self._slugs: Dict[str, int] = {}
+
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _load(self):
+        if self._is_fresh():
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._is_fresh():
+                return
+
+            generation = self._generation
+            async with await open_read_session() as session:
+                result = await session.execute(select(Category.id, Category.parent_id, Category.category_slug))
+
+            children = {}
+            slugs = {}
+            for category_id, parent_id, category_slug in result.all():
+                children.setdefault(parent_id, []).append(category_id)
+                slugs[category_slug] = category_id
+
+            self._children = children
+            self._slugs = slugs
+
+            # invalidated while loading, the next call has to reload
+            if generation == self._generation:
+                self._loaded_at = time.monotonic()
+
+    async def get_descendant_ids(self, category_slug: str) -> List[int]:
+        await self._load()
+
+        root_id = self._slugs.get(category_slug)
+        if root_id is None:
+            return []
+
+        ids = [root_id]
+        seen = {root_id}
+        stack = [root_id]
+        while stack:
+            for child_id in self._children.get(stack.pop(), []):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    ids.append(child_id)
+                    stack.append(child_id)
+
+        return ids
+
+
+category_tree = CategoryTree(CATEGORY_TREE_TTL)
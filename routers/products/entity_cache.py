@@ -0,0 +1,40 @@
+from config import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL, CATALOG_QUERY_CACHE_SIZE
+from routers.products.category_tree import category_tree
+from services.cache import EntityCache
+from services.coalesce import Coalescer
+from services.invalidation import invalidator
+from services.response_cache import response_cache
+
+product_cache = EntityCache("product_slug", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+category_cache = EntityCache("category_slug", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+heading_cache = EntityCache("heading_slug", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+tag_cache = EntityCache("tag_slug", ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+
+# filtered product lists, counts and facets, they depend on products, categories and tags alike
+catalog_queries = Coalescer(CATALOG_QUERY_CACHE_SIZE)
+
+invalidator.subscribe("product", product_cache.invalidate)
+invalidator.subscribe("category", category_cache.invalidate)
+invalidator.subscribe("category", lambda *category_ids: category_tree.invalidate())
+invalidator.subscribe("heading", heading_cache.invalidate)
+invalidator.subscribe("tag", tag_cache.invalidate)
+invalidator.subscribe("product", catalog_queries.invalidate)
+invalidator.subscribe("category", catalog_queries.invalidate)
+invalidator.subscribe("tag", catalog_queries.invalidate)
+
+
+def purge_responses(kind: str, list_key: str):
+    response_cache.register_kind(kind, list_key)
+
+    def purge(*entity_ids: int):
+        if not entity_ids:
+            response_cache.purge_all()
+        else:
+            response_cache.purge(list_key, *(f"{kind}-{entity_id}" for entity_id in entity_ids))
+    return purge
+
+
+invalidator.subscribe("product", purge_responses("product", "products"))
+invalidator.subscribe("category", purge_responses("category", "categories"))
+invalidator.subscribe("heading", purge_responses("heading", "headings"))
+invalidator.subscribe("tag", purge_responses("tag", "tags"))
@@ -0,0 +1,28 @@
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+
+# what a product card in a listing shows, product_description is only sent by the detail routes
+PRODUCT_LIST_FIELDS = ("id", "product_name", "product_slug", "image_path", "short_description",
+                       "price", "quantity", "measure", "product_weight")
+
+
+def select_fields(fields: Optional[str], schema, default: Sequence[str], required: Sequence[str] = ("id",)) -> tuple:
+    """Field names for a fields=a,b,c parameter, in the schema's order.
+
+    No parameter gives default, "*" gives every field of the schema. The required
+    fields (id, the sort key) are always added, unknown names are a 400.
+    """
+    if fields is None:
+        names = set(default)
+    elif fields.strip() == "*":
+        names = set(schema.__fields__)
+    else:
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+
+    unknown = names - set(schema.__fields__)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field {sorted(unknown)[0]}!")
+
+    names.update(name for name in required if name in schema.__fields__)
+    return tuple(name for name in schema.__fields__ if name in names)
@@ -1,13 +1,62 @@
+import json
 from typing import List, Union
 
 from fastapi import Query
-from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.category import Category
-from models.product import Product, ProductTags, ProductCategories
-from sqlalchemy import func, or_, select, label
+from models.product import Product, ProductTags, ProductCategories, SEARCH_CONFIG
+from sqlalchemy import func, select, any_, bindparam, Integer, or_, literal, cast
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from models.tag import Tag
+from routers.products.category_tree import category_tree
+
+DEFAULT_MIN_PRICE = 0
+DEFAULT_MAX_PRICE = 999999
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def estimate_rows(session: AsyncSession, query) -> int:
+    """Row count the planner expects the query to return, from table statistics only."""
+    plan = (await session.execute(Explain(query))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def like_pattern(search_query: str) -> str:
+    escaped = search_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def to_tsquery(search_query: str):
+    return func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), search_query)
+
+
+def search_by_name(query, column, search_query: str):
+    """Substring / typo tolerant name search served by the column's trigram index."""
+    search_query = search_query.strip()
+    if not search_query:
+        return query
+
+    return query.where(or_(
+        column.ilike(like_pattern(search_query), escape="\\"),
+        literal(search_query).op("<%")(column)
+    )).order_by(func.word_similarity(search_query, column).desc())
 
 
 class ProductFilter:
@@ -16,45 +65,51 @@ class ProductFilter:
     max_price: float
     tags: List[str]
     category: str
+    category_ids: List[int]
 
-    def __init__(self, min_price: float, max_price: float, search: str, tags: List[str], category: str):
+    def __init__(self, min_price: float, max_price: float, search: str, tags: List[str], category: str,
+                 category_ids: List[int] = None):
         self.min_price = min_price
         self.max_price = max_price
         self.search_query = search
         self.tags = tags
         self.category = category
+        self.category_ids = category_ids or []
+
+    def _search(self):
+        return self.search_query.strip()
+
+    def key(self) -> tuple:
+        """Identifies the filtered result, for caching and coalescing."""
+        tags = tuple(sorted(self.tags)) if self.tags is not None else None
+        return self.min_price, self.max_price, self._search(), tags, self.category
+
+    def is_empty(self) -> bool:
+        """No filter given, the query covers the whole visible catalog."""
+        return not self._search() and self.category is None and self.tags is None \
+            and self.min_price <= DEFAULT_MIN_PRICE and self.max_price >= DEFAULT_MAX_PRICE
 
     async def check(self, query):
         result = query.where(self.min_price <= Product.price) \
-            .where(Product.price <= self.max_price) \
-            .where(func.lower(Product.product_name).contains(self.search_query.lower()))
-
-        # Дальше бога нет
+            .where(Product.price <= self.max_price)
+
+        # full text over name and descriptions, trigram index for substrings and typos in the name
+        search = self._search()
+        if search:
+            result = result.where(or_(
+                Product.search_vector.op("@@")(to_tsquery(search)),
+                Product.product_name.ilike(like_pattern(search), escape="\\"),
+                literal(search).op("<%")(Product.product_name)
+            ))
+
+        # category and all of its subcategories, resolved from the in-process tree
         if self.category is not None:
-            max_depth = 5
-
-            category_hierarchy = select(Category.id, Category.parent_id, label("depth", 0)). \
-                filter(Category.category_slug == self.category). \
-                cte(name="category_hierarchy", recursive=True)
-
-            category_hierarchy_alias = aliased(category_hierarchy, name="ch")
-
-            category_hierarchy = category_hierarchy.union_all(
-                select(
-                    Category.id, Category.parent_id, category_hierarchy_alias.c.depth + 1
-                ).select_from(
-                    category_hierarchy_alias.join(Category, Category.parent_id == category_hierarchy_alias.c.id)
-                ).where(category_hierarchy_alias.c.depth < max_depth)
-            )
-
-            result = result. \
-                join(ProductCategories, Product.id == ProductCategories.product_id). \
-                join(category_hierarchy, or_(
-                    ProductCategories.category_id == category_hierarchy.c.id,
-                    ProductCategories.category_id.in_(select(Category.id)
-                                                  .where(category_hierarchy.c.id == ProductCategories.category_id))
-                )). \
-                distinct()
+            category_ids = bindparam("category_ids", self.category_ids, type_=ARRAY(Integer))
+
+            result = result.where(Product.id.in_(
+                select(ProductCategories.product_id)
+                .where(ProductCategories.category_id == any_(category_ids))
+            ))
 
         if self.tags is not None:
             result = result.join(ProductTags, Product.id == ProductTags.product_id)\
@@ -64,10 +119,24 @@ class ProductFilter:
 
         return result
 
+    def order(self, query):
+        search = self._search()
+        if not search:
+            return query
+
+        rank = func.ts_rank_cd(Product.search_vector, to_tsquery(search)) \
+            + func.word_similarity(search, Product.product_name)
+
+        return query.order_by(rank.desc(), Product.id)
+
+
+async def create_product_filter(min_price: float = Query(default=DEFAULT_MIN_PRICE),
+                                max_price: float = Query(default=DEFAULT_MAX_PRICE),
+                                search: str = Query(default=""),
+                                category: str = Query(default=None),
+                                tags: Union[List[str], None] = Query(default=None)):
+    category_ids = None
+    if category is not None:
+        category_ids = await category_tree.get_descendant_ids(category)
 
-def create_product_filter(min_price: float = Query(default=0),
-                          max_price: float = Query(default=999999),
-                          search: str = Query(default=""),
-                          category: str = Query(default=None),
-                          tags: Union[List[str], None] = Query(default=None)):
-    return ProductFilter(min_price, max_price, search, tags, category)
+    return ProductFilter(min_price, max_price, search, tags, category, category_ids)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, Request, HTTPException, Body, Query
 from fastapi.encoders import jsonable_encoder
@@ -6,76 +7,118 @@ from fastapi.encoders import jsonable_encoder
 from models.category import Category
 from models.heading import Heading
 from routers.auth.auth_bearer import JWTBearer
-from schemas.heading import HeadingCreate, HeadingUpdate
-from utils import to_slug
-from sqlalchemy import select, insert, update, delete, func
+from schemas.category import CategoryRead
+from schemas.heading import HeadingCreate, HeadingUpdate, HeadingRead
+from schemas.page import Page
+from utils import to_slug, columns_for, get_list_from_result
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import LIMIT
-from models.base import get_async_session
+from models.base import get_async_session, get_read_session
 from models.user import User
+from routers.products.entity_cache import heading_cache
+from routers.products.filters import search_by_name
+from routers.products.pagination import sort_keys, paginate, page_response, order_by_sort
 from routers.products.products import get_product_by_slug
+from services.invalidation import invalidator
+from services.json_response import FastJSONResponse
+from services.response_cache import add_surrogate_keys, set_last_modified
 
 router = APIRouter(
     prefix="/headings",
     tags=['headings']
 )
 
+HEADING_COLUMNS = columns_for(Heading, HeadingRead)
+HEADING_SORT_KEYS = sort_keys(Heading.id, heading_name=Heading.heading_name)
+
 
 @router.get("/id/{heading_id}")
-async def get_heading_by_id(heading_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Heading).where(Heading.id == heading_id)
-    result = await session.execute(query)
-    end = result.first()
+async def get_heading_by_id(heading_id: int, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        query = select(*HEADING_COLUMNS).where(Heading.id == heading_id)
+        result = await session.execute(query)
+        end = result.first()
 
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+        if end is None:
+            return None
+        return dict(end._mapping)
 
+    heading = await heading_cache.get_by_id(heading_id, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("headings" if heading is None else f"heading-{heading['id']}")
+    if heading is not None:
+        set_last_modified(heading["modified_at"])
+    return heading
+
+
+async def find_heading_by_slug(heading_slug: str, session: AsyncSession) -> Optional[dict]:
+    """Heading through the cache, without the Last-Modified of the detail route."""
+    async def load():
+        query = select(*HEADING_COLUMNS).where(Heading.heading_slug == heading_slug)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
+
+    heading = await heading_cache.get_by_slug(heading_slug, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("headings" if heading is None else f"heading-{heading['id']}")
+    return heading
 
-@router.get("/{heading_slug}")
-async def get_heading_by_slug(heading_slug: str, session: AsyncSession = Depends(get_async_session)):
-    query = select(Heading).where(Heading.heading_slug == heading_slug)
-    result = await session.execute(query)
-    end = result.first()
 
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+@router.get("/{heading_slug}")
+async def get_heading_by_slug(heading_slug: str, session: AsyncSession = Depends(get_read_session)):
+    heading = await find_heading_by_slug(heading_slug, session)
+    if heading is not None:
+        set_last_modified(heading["modified_at"])
+    return heading
 
 
-@router.get("")
-async def get_heading_all(offset: int, limit: int, search_query: str = Query(default=""),
-                          session: AsyncSession = Depends(get_async_session)):
+@router.get("", response_model=Union[Page[HeadingRead], List[HeadingRead]], response_class=FastJSONResponse)
+async def get_heading_all(limit: int, offset: Optional[int] = None, after: Optional[str] = None, sort: str = "id",
+                          search_query: str = Query(default=""),
+                          session: AsyncSession = Depends(get_read_session)):
     if limit > LIMIT:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    query = select(Heading).where(Heading.visible).offset(offset).limit(limit) \
-        .where(func.lower(Heading.heading_name).contains(search_query.lower()))
+    add_surrogate_keys("headings")
+
+    query = select(*HEADING_COLUMNS).where(Heading.visible)
+    query = search_by_name(query, Heading.heading_name, search_query)
+
+    if offset is not None:
+        query = order_by_sort(query, HEADING_SORT_KEYS, sort, Heading.id).offset(offset).limit(limit)
+    else:
+        query = paginate(query, HEADING_SORT_KEYS, sort, after, limit, Heading.id, search_query)
+
     result = await session.execute(query)
 
-    list = []
-    for key, category in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(category[0]))
+    list = get_list_from_result(result)
 
-    return list
+    if offset is not None:
+        return FastJSONResponse(list)
+    return FastJSONResponse(page_response(list, HEADING_SORT_KEYS, sort, limit))
 
 
-@router.get("/categories/{heading_slug}")
+@router.get("/categories/{heading_slug}", response_model=List[CategoryRead], response_class=FastJSONResponse)
 async def get_categories_of_heading_all(heading_slug: str,
-                                        session: AsyncSession = Depends(get_async_session)):
-    heading = await get_heading_by_slug(heading_slug, session)
+                                        session: AsyncSession = Depends(get_read_session)):
+    heading = await find_heading_by_slug(heading_slug, session)
     if heading is None:
-        return {"status": "failure"}
+        # a Response skips response_model, which the failure body doesn't match
+        return FastJSONResponse({"status": "failure"})
 
-    query = select(Category).where(Category.visible).where(Category.heading_id == heading["id"])
-    result = await session.execute(query)
+    add_surrogate_keys("categories")
 
-    list = []
-    for key, category in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(category[0]))
+    query = select(*columns_for(Category, CategoryRead)).where(Category.visible) \
+        .where(Category.heading_id == heading["id"])
+    result = await session.execute(query)
 
-    return list
+    return FastJSONResponse(get_list_from_result(result))
 
 
 @router.post("/create")
@@ -92,8 +135,9 @@ async def create_heading(new_heading: HeadingCreate,
     if len(result) != 0:
         return {"status": "failure", "detail": "slug is already exists"}
 
-    statement = insert(Heading).values(**new_heading.dict(), heading_slug=slug)
-    await session.execute(statement)
+    statement = insert(Heading).values(**new_heading.dict(), heading_slug=slug).returning(Heading.id)
+    heading_id = (await session.execute(statement)).scalar_one()
+    await invalidator.publish(session, "heading", heading_id)
     await session.commit()
 
     return {"status": "success"}
@@ -128,6 +172,7 @@ async def update_heading_by_id(request: Request,
                                                                        created_at=result[0].created_at,
                                                                        modified_at=datetime.utcnow())
     await session.execute(statement)
+    await invalidator.publish(session, "heading", heading_id)
     await session.commit()
 
     return {"status": "success"}
@@ -0,0 +1,177 @@
+import asyncio
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.base import open_read_session
+from models.category import Category
+from models.product import Product, ProductCategories, ProductTags
+from models.tag import Tag
+from schemas.category import CategoryRead
+from schemas.product import ProductRead
+from schemas.tag import TagRead
+from utils import columns_for, get_list_from_result
+
+PRODUCT_COLUMNS = columns_for(Product, ProductRead)
+CATEGORY_COLUMNS = columns_for(Category, CategoryRead)
+TAG_COLUMNS = columns_for(Tag, TagRead)
+
+
+async def load_products(session: AsyncSession, product_ids: Sequence[int],
+                        visible_only: bool = True) -> List[Optional[dict]]:
+    """Loads products with one IN query, in the order of product_ids (None where missing)."""
+    if not product_ids:
+        return []
+
+    query = select(*PRODUCT_COLUMNS).where(Product.id.in_(set(product_ids)))
+    if visible_only:
+        query = query.where(Product.visible)
+
+    result = await session.execute(query)
+
+    products: Dict[int, dict] = {}
+    for product in get_list_from_result(result):
+        products[product["id"]] = product
+
+    return [products.get(product_id) for product_id in product_ids]
+
+
+async def load_linked_products(session: AsyncSession, link_model, link_column, link_id: int,
+                               offset: int, limit: int, columns: Optional[list] = None) -> List[dict]:
+    """Visible products attached through a link table (product_categories, product_tags) in one join.
+
+    Pages in link insertion order, hidden products are skipped before paging.
+    """
+    query = select(*(columns or PRODUCT_COLUMNS)) \
+        .join(link_model, link_model.product_id == Product.id) \
+        .where(link_column == link_id) \
+        .where(Product.visible) \
+        .order_by(link_model.id) \
+        .offset(offset).limit(limit)
+    result = await session.execute(query)
+
+    return get_list_from_result(result)
+
+
+class DataLoader:
+    """Request scoped batching and caching of lookups by key.
+
+    load() calls made before the event loop gets back to this loader are collected and
+    resolved with one batch_load(keys) call, which returns the values in the order of keys.
+    """
+
+    def __init__(self, batch_load: Callable[[List[Hashable]], Awaitable[List[Any]]]):
+        self.batch_load = batch_load
+
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    async def load(self, key: Hashable) -> Any:
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[key] = future
+            self._queue.append(key)
+
+            if len(self._queue) == 1:
+                asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+
+        return await future
+
+    async def load_many(self, keys: Sequence[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+
+        try:
+            values = await self.batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                self._futures.pop(key).set_exception(e)
+        else:
+            for key, value in zip(keys, values):
+                self._futures[key].set_result(value)
+
+
+INCLUDES = ("categories", "tags")
+
+
+def parse_include(include: Optional[str]) -> tuple:
+    if not include:
+        return ()
+
+    names = {name.strip() for name in include.split(",") if name.strip()}
+    for name in names:
+        if name not in INCLUDES:
+            raise HTTPException(status_code=400, detail=f"Unknown include {name}!")
+
+    return tuple(name for name in INCLUDES if name in names)
+
+
+class Loaders:
+    """DataLoaders of one request, for the relations a product listing can embed.
+
+    The read session is only opened once something is loaded and the batches share it
+    one at a time, so asking for both relations costs one connection and two queries.
+    """
+
+    def __init__(self):
+        self.categories = DataLoader(self._load_categories)
+        self.tags = DataLoader(self._load_tags)
+
+        self._session: Optional[AsyncSession] = None
+        self._lock = asyncio.Lock()
+
+    async def _execute(self, query):
+        async with self._lock:
+            if self._session is None:
+                self._session = await open_read_session()
+            return await self._session.execute(query)
+
+    async def _load_linked(self, model, columns: list, link_model, link_column,
+                           product_ids: List[int]) -> List[List[dict]]:
+        query = select(link_model.product_id.label("linked_product_id"), *columns) \
+            .select_from(model) \
+            .join(link_model, link_column == model.id) \
+            .where(link_model.product_id.in_(product_ids)) \
+            .order_by(link_model.id)
+        result = await self._execute(query)
+
+        linked: Dict[int, List[dict]] = {product_id: [] for product_id in product_ids}
+        for row in get_list_from_result(result):
+            linked[row.pop("linked_product_id")].append(row)
+
+        return [linked[product_id] for product_id in product_ids]
+
+    async def _load_categories(self, product_ids: List[int]) -> List[List[dict]]:
+        return await self._load_linked(Category, CATEGORY_COLUMNS, ProductCategories, ProductCategories.category_id,
+                                       product_ids)
+
+    async def _load_tags(self, product_ids: List[int]) -> List[List[dict]]:
+        return await self._load_linked(Tag, TAG_COLUMNS, ProductTags, ProductTags.tag_id, product_ids)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def embed(self, products: List[dict], include: Sequence[str]) -> List[dict]:
+        """Copies of products with the included relations added, the originals may be shared through caches."""
+        if not include:
+            return products
+
+        product_ids = [product["id"] for product in products]
+        relations = {name: await getattr(self, name).load_many(product_ids) for name in include}
+
+        return [{**product, **{name: relations[name][index] for name in include}}
+                for index, product in enumerate(products)]
+
+
+async def get_loaders() -> AsyncGenerator[Loaders, None]:
+    loaders = Loaders()
+    try:
+        yield loaders
+    finally:
+        await loaders.close()
@@ -3,18 +3,22 @@ from typing import List
 from fastapi import APIRouter, Depends, Body
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import select, insert, desc
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import get_async_session
-from models.order import Order, OrderProduct
+from models.order import Order, OrderProduct, OrderNumberCounter
 
 import datetime
 
-from models.product import Product
 from models.user import User
 from routers.auth.auth_bearer import JWTBearer
-from utils import send_message
+from routers.products.loaders import load_products
+from schemas.order import OrderRead
+from services.json_response import FastJSONResponse
+from services.notifications import enqueue_notification, notification_dispatcher
+from utils import columns_for, get_list_from_result
 
 router = APIRouter(
     prefix="/orders",
@@ -27,70 +31,77 @@ class CartProduct(BaseModel):
     quantity: int
 
 
-@router.get("/active_orders")
+async def next_order_number(session: AsyncSession) -> str:
+    """Allocates the next DDMMYYYYnnnnn number from the per-day counter row.
+
+    The upsert runs in the checkout transaction, so a failed checkout rolls the
+    counter back with it. The row lock is held until that transaction ends.
+    """
+    dt_now = datetime.datetime.now()
+    today = f"{dt_now.day:02}{dt_now.month:02}{dt_now.year}"
+
+    statement = pg_insert(OrderNumberCounter).values(day=today, value=1) \
+        .on_conflict_do_update(index_elements=[OrderNumberCounter.day],
+                               set_={"value": OrderNumberCounter.value + 1}) \
+        .returning(OrderNumberCounter.value)
+
+    final_id = (await session.execute(statement)).scalar_one()
+
+    return f"{today}{final_id:05}"
+
+
+@router.get("/active_orders", response_model=List[OrderRead], response_class=FastJSONResponse)
 async def get_active_orders(session: AsyncSession = Depends(get_async_session),
                             user: User = Depends(JWTBearer())):
-    query = select(Order).where(Order.active).where(Order.mobile_phone == user.mobile_phone)
+    query = select(*columns_for(Order, OrderRead)).where(Order.active).where(Order.mobile_phone == user.mobile_phone)
     result = await session.execute(query)
 
-    list = []
-    for key, product in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(product[0]))
-
-    return list
+    return FastJSONResponse(get_list_from_result(result))
 
 
 @router.post("/create", response_model=None)
 async def create_order(user: User = Depends(JWTBearer()),
                        cart_products: List[CartProduct] = Body(..., embed=True),
                        session: AsyncSession = Depends(get_async_session)):
-    query_newest = select(Order).order_by(desc(Order.created_at)).limit(1)
-    result_newest = (await session.execute(query_newest)).fetchall()
+    # everything, the order number included, runs in one transaction, committed once at the end
+    new_order_number = await next_order_number(session)
 
-    final_id = 1
-    dt_now = datetime.datetime.now()
-    today = f"{dt_now.day:02}{dt_now.month:02}{dt_now.year}"
-    if len(result_newest) != 0 and result_newest[0][0].order_number[0:8] == today:
-        final_id = int(result_newest[0][0].order_number[-5:]) + 1
-
-    new_order_number = f"{today}{final_id:05}"
-
-    statement = insert(Order).values(mobile_phone=user.mobile_phone, order_number=new_order_number, created_at=datetime.datetime.utcnow())
-    await session.execute(statement)
-    await session.commit()
-
-    order_query = select(Order).where(Order.order_number == new_order_number)
-    order_result = (await session.execute(order_query)).first()[0]
+    statement = insert(Order).values(mobile_phone=user.mobile_phone, order_number=new_order_number,
+                                     created_at=datetime.datetime.utcnow()).returning(Order)
+    order_result = (await session.execute(statement)).scalar_one()
 
-    ids = []
     quantity_to_id = {}
+    order_products = []
     for product in cart_products:
-        statement = insert(OrderProduct).values(order_id=order_result.id, product_id=product.product_id,
-                                                quantity=product.quantity)
-        await session.execute(statement)
+        order_products.append({
+            "order_id": order_result.id,
+            "product_id": product.product_id,
+            "quantity": product.quantity
+        })
 
-        ids.append(product.product_id)
         quantity_to_id[product.product_id] = product.quantity
 
-    await session.commit()
-
-    product_query = select(Product).filter(Product.id.in_(ids))
-    result = await session.execute(product_query)
+    # a single multi-row INSERT for all lines
+    if order_products:
+        await session.execute(insert(OrderProduct), order_products)
 
-    list = []
-    for key, product in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(product[0]))
+    products = await load_products(session, tuple(quantity_to_id), visible_only=False)
+    list = [product for product in products if product is not None]
 
     product_msg = ""
     for key, product in enumerate(list):
         product_msg += f"       {key + 1}. {product['product_name']}, {product['price']}tg " \
                        f"в количестве: {quantity_to_id[product['id']]}\n"
 
-    send_message(f"""
+    # goes out through the outbox, only if the order itself commits
+    await enqueue_notification(session, f"""
     Заказ №{new_order_number},
         Телефон: {user.mobile_phone},
         Товары: 
 {product_msg}
     """)
 
+    await session.commit()
+    notification_dispatcher.wake()
+
     return jsonable_encoder(order_result)
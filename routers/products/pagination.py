@@ -0,0 +1,122 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+def parse_decimal(value) -> Decimal:
+    return Decimal(str(value))
+
+
+class SortKey:
+    """Column a list can be ordered by, and how to read its value back from a cursor.
+
+    The sort key name has to match the field name of the serialized item.
+    """
+
+    def __init__(self, column, parse: Callable = str):
+        self.column = column
+        self.parse = parse
+
+
+def sort_keys(id_column, **columns) -> Dict[str, SortKey]:
+    keys = {"id": SortKey(id_column, int)}
+    for name, value in columns.items():
+        keys[name] = value if isinstance(value, SortKey) else SortKey(value)
+
+    return keys
+
+
+def _dump_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _parse_sort(keys: Dict[str, SortKey], sort: str) -> Tuple[str, SortKey, bool]:
+    descending = sort.startswith("-")
+    name = sort[1:] if descending else sort
+
+    if name not in keys:
+        raise HTTPException(status_code=400, detail="Unknown sort key!")
+
+    return name, keys[name], descending
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    payload = json.dumps([sort, _dump_value(value), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, key: SortKey):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort:
+            raise ValueError(cursor_sort)
+
+        return key.parse(value), int(row_id)
+    except (ValueError, TypeError, ArithmeticError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor!")
+
+
+def order_by_sort(query, keys: Dict[str, SortKey], sort: str, id_column):
+    """Stable ordering (sort key, then id) for the legacy offset path."""
+    name, key, descending = _parse_sort(keys, sort)
+    if name == "id":
+        return query.order_by(id_column.desc() if descending else id_column)
+
+    if descending:
+        return query.order_by(key.column.desc(), id_column.desc())
+    return query.order_by(key.column, id_column)
+
+
+def paginate(query, keys: Dict[str, SortKey], sort: str, after: Optional[str], limit: int, id_column,
+             search: str = ""):
+    """Keyset page: rows strictly after the cursor, in (sort key, id) order.
+
+    Fetches one extra row so the caller can tell whether there is a next page.
+    Search results are ordered by relevance, which has no cursor, so they only page with offset.
+    """
+    if search.strip():
+        raise HTTPException(status_code=400, detail="Search results are paged with offset!")
+
+    name, key, descending = _parse_sort(keys, sort)
+
+    query = order_by_sort(query.order_by(None), keys, sort, id_column)
+
+    if after is not None:
+        value, row_id = decode_cursor(after, sort, key)
+
+        if name == "id":
+            query = query.where(id_column < row_id if descending else id_column > row_id)
+        elif descending:
+            query = query.where(tuple_(key.column, id_column) < tuple_(value, row_id))
+        else:
+            query = query.where(tuple_(key.column, id_column) > tuple_(value, row_id))
+
+    return query.limit(limit + 1)
+
+
+def page_response(items: List[dict], keys: Dict[str, SortKey], sort: str, limit: int):
+    """Trims the extra row fetched by paginate() and builds the next cursor from the last item."""
+    next_cursor = None
+
+    if len(items) > limit:
+        items = items[:limit]
+
+        name, key, descending = _parse_sort(keys, sort)
+        last = items[-1]
+        next_cursor = encode_cursor(sort, last[name], last["id"])
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor
+    }
@@ -1,165 +1,392 @@
 import datetime
+import json
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, Request, HTTPException, Body
+from fastapi import APIRouter, Depends, Request, HTTPException, Body, Query
 from fastapi.encoders import jsonable_encoder
 
 from models.category import Category
 from models.tag import Tag
 from routers.auth.auth_bearer import JWTBearer
-from utils import to_slug
-from sqlalchemy import select, insert, update, text, func
+from utils import to_slug, columns_for, get_list_from_result
+from sqlalchemy import select, insert, update, text, func, case, true
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
-from config import LIMIT
-from models.base import get_async_session
+from config import LIMIT, APPROXIMATE_COUNT_THRESHOLD, CATALOG_CACHE_WINDOWS
+from models.base import get_async_session, get_read_session, open_read_session
 from models.product import Product, ProductCategories, ProductTags
 from models.user import User
-from routers.products.filters import create_product_filter, ProductFilter
-from schemas.product import ProductCreate, ProductUpdate
+from routers.products.fields import select_fields, PRODUCT_LIST_FIELDS
+from routers.products.filters import create_product_filter, ProductFilter, estimate_rows
+from routers.products.entity_cache import product_cache, catalog_queries
+from routers.products.loaders import load_linked_products, PRODUCT_COLUMNS, Loaders, get_loaders, parse_include
+from routers.products.pagination import sort_keys, SortKey, parse_decimal, paginate, page_response, order_by_sort
+from schemas.category import CategoryRead
+from schemas.page import Page
+from schemas.product import ProductCreate, ProductUpdate, ProductRead, ProductBatch
+from schemas.tag import TagRead
+from services.invalidation import invalidator
+from services.json_response import FastJSONResponse
+from services.response_cache import add_surrogate_keys, set_last_modified
 
 router = APIRouter(
     prefix="/products",
     tags=['products']
 )
 
+PRODUCT_SORT_KEYS = sort_keys(Product.id,
+                              price=SortKey(Product.price, parse_decimal),
+                              product_name=Product.product_name)
 
-@router.get("/id/{product_id}")
-async def get_product_by_id(product_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Product).where(Product.visible and Product.id == product_id)
-    result = await session.execute(query)
-    end = result.first()
 
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+@router.get("/id/{product_id}")
+async def get_product_by_id(product_id: int, session: AsyncSession = Depends(get_read_session),
+                           include: Optional[str] = None, loaders: Loaders = Depends(get_loaders)):
+    include = parse_include(include)
+
+    async def load():
+        query = select(*PRODUCT_COLUMNS).where(Product.visible).where(Product.id == product_id)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
+
+    product = await product_cache.get_by_id(product_id, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("products" if product is None else f"product-{product['id']}")
+    if product is not None:
+        # embedded categories and tags change without touching modified_at, only the ETag covers them
+        if include:
+            add_surrogate_keys(*include)
+            product = (await loaders.embed([product], include))[0]
+        else:
+            set_last_modified(product["modified_at"])
+    return product
+
+
+async def find_product_by_slug(product_slug: str, session: AsyncSession) -> Optional[dict]:
+    """Visible product through the cache, without the Last-Modified of the detail route.
+
+    For routes that only resolve the slug, what they return changes without touching modified_at.
+    """
+    async def load():
+        query = select(*PRODUCT_COLUMNS).where(Product.visible).where(Product.product_slug == product_slug)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
+
+    product = await product_cache.get_by_slug(product_slug, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("products" if product is None else f"product-{product['id']}")
+    return product
 
 
 @router.get("/{product_slug}")
-async def get_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_async_session)):
-    query = select(Product).where(Product.visible and Product.product_slug == product_slug)
-    result = await session.execute(query)
-    end = result.first()
-
-    if end is None:
-        return None
-    return jsonable_encoder(end[0])
+async def get_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_read_session),
+                           include: Optional[str] = None, loaders: Loaders = Depends(get_loaders)):
+    include = parse_include(include)
+
+    product = await find_product_by_slug(product_slug, session)
+    if product is not None:
+        # embedded categories and tags change without touching modified_at, only the ETag covers them
+        if include:
+            add_surrogate_keys(*include)
+            product = (await loaders.embed([product], include))[0]
+        else:
+            set_last_modified(product["modified_at"])
+    return product
+
+
+async def get_product_id_by_slug(product_slug: str, session: AsyncSession) -> int:
+    """For admin writes, hidden products too and not from the cache (the session is the writer's)."""
+    result = await session.execute(select(Product.id).where(Product.product_slug == product_slug))
+    product_id = result.scalar_one_or_none()
+
+    if product_id is None:
+        raise HTTPException(status_code=400, detail="Product doesn't exist!")
+    return product_id
 
 
-@router.get("")
-async def get_product_all(offset: int, limit: int, filter: ProductFilter = Depends(create_product_filter),
-                          session: AsyncSession = Depends(get_async_session)):
+@router.get("", response_model=Union[Page[ProductRead], List[ProductRead]], response_class=FastJSONResponse)
+async def get_product_all(limit: int, offset: Optional[int] = None, after: Optional[str] = None, sort: str = "id",
+                          fields: Optional[str] = None, include: Optional[str] = None,
+                          filter: ProductFilter = Depends(create_product_filter),
+                          loaders: Loaders = Depends(get_loaders)):
     if limit > LIMIT:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    query = select(Product).where(Product.visible).offset(offset).limit(limit)
-    query = await filter.check(query)
-    result = await session.execute(query)
+    add_surrogate_keys("products", "categories", "tags")
 
-    list = []
-    for key, product in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(product[0]))
+    # the sort key has to be in the items, the next cursor is built from the last one
+    names = select_fields(fields, ProductRead, PRODUCT_LIST_FIELDS, required=("id", sort.lstrip("-")))
+    include = parse_include(include)
 
-    return list
+    async def run():
+        async with await open_read_session() as session:
+            query = select(*columns_for(Product, ProductRead, names)).where(Product.visible)
+            query = await filter.check(query)
 
+            # offset is the legacy path and returns a bare list, without it the page is keyset based
+            if offset is not None:
+                query = filter.order(query)
+                query = order_by_sort(query, PRODUCT_SORT_KEYS, sort, Product.id).offset(offset).limit(limit)
+            else:
+                query = paginate(query, PRODUCT_SORT_KEYS, sort, after, limit, Product.id, filter.search_query)
 
-@router.get("/count/")
-async def count_product_all(filter: ProductFilter = Depends(create_product_filter),
-                            session: AsyncSession = Depends(get_async_session)):
-    query = select(Product).where(Product.visible)
-    query = await filter.check(query)
+            result = await session.execute(query)
 
-    result = await session.execute(query)
+            list = get_list_from_result(result)
 
-    return len(result.fetchall())
+            if offset is not None:
+                return list
+            return page_response(list, PRODUCT_SORT_KEYS, sort, limit)
 
+    result = await catalog_queries.get(("products", filter.key(), limit, offset, after, sort, names), run,
+                                       *CATALOG_CACHE_WINDOWS["products"])
 
-@router.get("/price_range/")
-async def get_price_range(filter: ProductFilter = Depends(create_product_filter),
-                          session: AsyncSession = Depends(get_async_session)):
-    query_min = select(func.min(Product.price)).where(Product.visible)
-    query_min = await filter.check(query_min)
+    # embedded per request, the coalesced result stays the same for every include
+    if include and offset is not None:
+        result = await loaders.embed(result, include)
+    elif include:
+        result = {**result, "items": await loaders.embed(result["items"], include)}
+    return FastJSONResponse(result)
+
+
+@router.get("/count/", response_class=FastJSONResponse)
+async def count_product_all(approximate: bool = False,
+                            filter: ProductFilter = Depends(create_product_filter)):
+    add_surrogate_keys("products", "categories", "tags")
+
+    async def run():
+        async with await open_read_session() as session:
+            query = select(Product.id).where(Product.visible)
+            query = await filter.check(query)
+
+            # planner estimate only for the whole (big) catalog, it is way off for searches, tags and
+            # categories, and small results are cheap to count exactly
+            if approximate and filter.is_empty():
+                estimate = await estimate_rows(session, query)
+                if estimate >= APPROXIMATE_COUNT_THRESHOLD:
+                    return estimate
+
+            count_query = select(func.count()).select_from(query.subquery())
+            result = await session.execute(count_query)
+
+            return result.scalar()
+
+    result = await catalog_queries.get(("count", filter.key(), approximate), run,
+                                       *CATALOG_CACHE_WINDOWS["count"])
+    return FastJSONResponse(result)
+
+
+@router.get("/price_range/", response_class=FastJSONResponse)
+async def get_price_range(filter: ProductFilter = Depends(create_product_filter)):
+    add_surrogate_keys("products", "categories", "tags")
+
+    async def run():
+        async with await open_read_session() as session:
+            filtered = (await filter.check(select(Product.price).where(Product.visible))).subquery()
+
+            query = select(func.min(filtered.c.price), func.max(filtered.c.price))
+            result_min, result_max = (await session.execute(query)).first()
+
+            return {
+                "min_price": result_min,
+                "max_price": result_max
+            }
+
+    result = await catalog_queries.get(("price_range", filter.key()), run,
+                                       *CATALOG_CACHE_WINDOWS["price_range"])
+    return FastJSONResponse(result)
+
+
+@router.get("/facets/", response_class=FastJSONResponse)
+async def get_product_facets(buckets: int = Query(default=10, ge=1, le=100),
+                             filter: ProductFilter = Depends(create_product_filter)):
+    add_surrogate_keys("products", "categories", "tags")
+
+    async def run():
+        async with await open_read_session() as session:
+            filtered = (await filter.check(select(Product.id, Product.price).where(Product.visible))).cte("filtered")
+
+            stats = select(func.count().label("total"),
+                           func.min(filtered.c.price).label("min_price"),
+                           func.max(filtered.c.price).label("max_price")).cte("stats")
+
+            # values equal to max_price land in bucket buckets + 1, fold them into the last one
+            bucket = case(
+                (stats.c.min_price == stats.c.max_price, 1),
+                else_=func.least(func.width_bucket(filtered.c.price, stats.c.min_price, stats.c.max_price, buckets), buckets)
+            ).label("bucket")
+            histogram = select(bucket, func.count().label("count")) \
+                .select_from(filtered).join(stats, true()) \
+                .group_by(bucket).subquery()
+
+            tag_counts = select(Tag.tag_slug, Tag.tag_name, func.count().label("count")) \
+                .select_from(filtered) \
+                .join(ProductTags, ProductTags.product_id == filtered.c.id) \
+                .join(Tag, Tag.id == ProductTags.tag_id) \
+                .group_by(Tag.id).subquery()
+
+            histogram_json = select(func.json_agg(func.json_build_object(
+                "bucket", histogram.c.bucket, "count", histogram.c.count
+            ))).scalar_subquery()
+            tags_json = select(func.json_agg(func.json_build_object(
+                "tag_slug", tag_counts.c.tag_slug, "tag_name", tag_counts.c.tag_name, "count", tag_counts.c.count
+            ))).scalar_subquery()
+
+            query = select(stats.c.total, stats.c.min_price, stats.c.max_price, histogram_json, tags_json)
+            total, min_price, max_price, histogram_rows, tag_rows = (await session.execute(query)).first()
+
+            histogram_rows = json.loads(histogram_rows) if isinstance(histogram_rows, str) else histogram_rows or []
+            tag_rows = json.loads(tag_rows) if isinstance(tag_rows, str) else tag_rows or []
+
+            histogram_list = []
+            if total:
+                counts = {row["bucket"]: row["count"] for row in histogram_rows}
+                width = (max_price - min_price) / buckets
+                for index in range(buckets):
+                    histogram_list.append({
+                        "from": min_price + width * index,
+                        "to": max_price if index == buckets - 1 else min_price + width * (index + 1),
+                        "count": counts.get(index + 1, 0)
+                    })
+
+            return {
+                "count": total,
+                "min_price": min_price,
+                "max_price": max_price,
+                "histogram": histogram_list,
+                "tags": sorted(tag_rows, key=lambda row: row["count"], reverse=True)
+            }
+
+    result = await catalog_queries.get(("facets", filter.key(), buckets), run,
+                                       *CATALOG_CACHE_WINDOWS["facets"])
+    return FastJSONResponse(result)
+
+
+async def products_batch(ids: Optional[List[int]], slugs: Optional[List[str]], include: Optional[str],
+                             loaders: Loaders) -> FastJSONResponse:
+    if (ids is None) == (slugs is None):
+        raise HTTPException(status_code=400, detail="Either ids or slugs are required!")
+
+    keys = ids if ids is not None else slugs
+    if len(keys) > LIMIT:
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-    query_max = select(func.max(Product.price)).where(Product.visible)
-    query_max = await filter.check(query_max)
+    include = parse_include(include)
+    column = Product.id if ids is not None else Product.product_slug
 
-    result_min = (await session.execute(query_min)).scalar()
-    result_max = (await session.execute(query_max)).scalar()
+    async def load_many(missing: List[Union[int, str]]) -> List[dict]:
+        async with await open_read_session() as session:
+            query = select(*PRODUCT_COLUMNS).where(Product.visible).where(column.in_(missing))
+            result = await session.execute(query)
 
-    return {
-        "min_price": result_min,
-        "max_price": result_max
-    }
+            return get_list_from_result(result)
 
+    list = await product_cache.get_many(keys, slugs is not None, load_many)
 
-@router.get("/{category_id}/all/{offset}")
-async def get_category_product_all(category_id: int, offset: int, limit: int,
-                                   session: AsyncSession = Depends(get_async_session)):
-    if limit > LIMIT:
-        raise HTTPException(status_code=403, detail="Forbidden")
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("products", *include)
+    if not include:
+        for product in list:
+            if product is not None:
+                set_last_modified(product["modified_at"])
 
-    query = select(ProductCategories).where(ProductCategories.category_id == category_id).offset(offset).limit(limit)
-    result = await session.execute(query)
+    found = iter(await loaders.embed([product for product in list if product is not None], include))
+    return FastJSONResponse([next(found) if product is not None else None for product in list])
 
-    list = []
-    for key, productCategory in enumerate(result.fetchall()):
-        list.append(await get_product_by_id(productCategory[0].product_id, session))
 
-    return list
+@router.post("/batch", response_model=List[Optional[ProductRead]], response_class=FastJSONResponse)
+async def post_products_batch(batch: ProductBatch, include: Optional[str] = None,
+                              loaders: Loaders = Depends(get_loaders)):
+    return await products_batch(batch.ids, batch.slugs, include, loaders)
 
 
-@router.get("/{tag_id}/all/{offset}")
-async def get_tag_product_all(tag_id: int, offset: int, limit: int, session: AsyncSession = Depends(get_async_session)):
+@router.get("/batch/", response_model=List[Optional[ProductRead]], response_class=FastJSONResponse)
+async def get_products_batch_by_query(ids: Optional[str] = None, slugs: Optional[str] = None,
+                                      include: Optional[str] = None, loaders: Loaders = Depends(get_loaders)):
+    """Same as POST /products/batch with comma separated ids or slugs, cacheable by URL."""
+    if ids is not None:
+        try:
+            ids = [int(product_id) for product_id in ids.split(",") if product_id.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid ids!")
+    if slugs is not None:
+        slugs = [slug.strip() for slug in slugs.split(",") if slug.strip()]
+
+    return await products_batch(ids, slugs, include, loaders)
+
+
+@router.get("/{category_id}/all/{offset}", response_model=List[ProductRead], response_class=FastJSONResponse)
+async def get_category_product_all(category_id: int, offset: int, limit: int, fields: Optional[str] = None,
+                                   include: Optional[str] = None, session: AsyncSession = Depends(get_read_session),
+                                   loaders: Loaders = Depends(get_loaders)):
     if limit > LIMIT:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    query = select(ProductTags).where(ProductTags.tag_id == tag_id).offset(offset).limit(limit)
-    result = await session.execute(query)
+    include = parse_include(include)
+    add_surrogate_keys("products", *include)
+    columns = columns_for(Product, ProductRead, select_fields(fields, ProductRead, PRODUCT_LIST_FIELDS))
+    list = await load_linked_products(session, ProductCategories, ProductCategories.category_id, category_id,
+                                      offset, limit, columns)
+    return FastJSONResponse(await loaders.embed(list, include))
 
-    list = []
-    for key, productTag in enumerate(result.fetchall()):
-        list.append(await get_product_by_id(productTag[0].product_id, session))
 
-    return list
+@router.get("/tag/{tag_id}/all/{offset}", response_model=List[ProductRead], response_class=FastJSONResponse)
+async def get_tag_product_all(tag_id: int, offset: int, limit: int, fields: Optional[str] = None,
+                              include: Optional[str] = None, session: AsyncSession = Depends(get_read_session),
+                              loaders: Loaders = Depends(get_loaders)):
+    if limit > LIMIT:
+        raise HTTPException(status_code=403, detail="Forbidden")
 
+    include = parse_include(include)
+    add_surrogate_keys("products", *include)
+    columns = columns_for(Product, ProductRead, select_fields(fields, ProductRead, PRODUCT_LIST_FIELDS))
+    list = await load_linked_products(session, ProductTags, ProductTags.tag_id, tag_id, offset, limit, columns)
+    return FastJSONResponse(await loaders.embed(list, include))
 
-@router.get("/id/{product_id}/categories")
-async def get_categories_of_product_by_id(product_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Category).join(ProductCategories).filter(ProductCategories.product_id == product_id)
-    result = await session.execute(query)
-    categories = result.fetchall()
 
-    list = []
-    for key, category in enumerate(categories):
-        list.append(jsonable_encoder(category[0]))
+@router.get("/id/{product_id}/categories", response_model=List[CategoryRead], response_class=FastJSONResponse)
+async def get_categories_of_product_by_id(product_id: int, session: AsyncSession = Depends(get_read_session)):
+    add_surrogate_keys(f"product-{product_id}", "categories")
 
-    return list
+    query = select(*columns_for(Category, CategoryRead)).join(ProductCategories) \
+        .filter(ProductCategories.product_id == product_id)
+    result = await session.execute(query)
+
+    return FastJSONResponse(get_list_from_result(result))
 
 
-@router.get("/{product_slug}/categories")
-async def get_categories_of_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_async_session)):
-    product = await get_product_by_slug(product_slug, session)
+@router.get("/{product_slug}/categories", response_model=Optional[List[CategoryRead]],
+            response_class=FastJSONResponse)
+async def get_categories_of_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_read_session)):
+    product = await find_product_by_slug(product_slug, session)
     if product is None:
         return None
 
     return await get_categories_of_product_by_id(product["id"], session)
 
 
-@router.get("/id/{product_id}/tags")
-async def get_tags_of_product_by_id(product_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Tag).join(ProductTags).filter(ProductTags.product_id == product_id)
-    result = await session.execute(query)
-    categories = result.fetchall()
+@router.get("/id/{product_id}/tags", response_model=List[TagRead], response_class=FastJSONResponse)
+async def get_tags_of_product_by_id(product_id: int, session: AsyncSession = Depends(get_read_session)):
+    add_surrogate_keys(f"product-{product_id}", "tags")
 
-    list = []
-    for key, tag in enumerate(categories):
-        list.append(jsonable_encoder(tag[0]))
+    query = select(*columns_for(Tag, TagRead)).join(ProductTags).filter(ProductTags.product_id == product_id)
+    result = await session.execute(query)
 
-    return list
+    return FastJSONResponse(get_list_from_result(result))
 
 
-@router.get("/{product_slug}/tags")
-async def get_tags_of_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_async_session)):
-    product = await get_product_by_slug(product_slug, session)
+@router.get("/{product_slug}/tags", response_model=Optional[List[TagRead]], response_class=FastJSONResponse)
+async def get_tags_of_product_by_slug(product_slug: str, session: AsyncSession = Depends(get_read_session)):
+    product = await find_product_by_slug(product_slug, session)
     if product is None:
         return None
 
@@ -181,8 +408,9 @@ async def create_product(request: Request,
     if len(result) != 0:
         return {"status": "failure", "detail": "slug is already exists"}
 
-    statement = insert(Product).values(**new_product.dict(), product_slug=slug)
-    await session.execute(statement)
+    statement = insert(Product).values(**new_product.dict(), product_slug=slug).returning(Product.id)
+    product_id = (await session.execute(statement)).scalar_one()
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -197,7 +425,7 @@ async def update_product_by_id(request: Request,
     if not user.is_superuser:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    query = select(Product).where(Product.id == product_id)
+    query = select(Product).options(undefer(Product.product_description)).where(Product.id == product_id)
     result = (await session.execute(query)).first()
 
     if result is None:
@@ -215,6 +443,7 @@ async def update_product_by_id(request: Request,
 
     statement = update(Product).where(Product.id == product_id).values(**override_dict, created_at=result[0].created_at, modified_at=datetime.datetime.utcnow())
     await session.execute(statement)
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -229,8 +458,6 @@ async def update_product_by_slug(request: Request,
     if not user.is_superuser:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    product = await get_product_by_slug(product_slug, session)
-    if product is None:
-        return {"status": "failure"}
+    product_id = await get_product_id_by_slug(product_slug, session)
 
-    return await update_product_by_id(request, product["id"], updated_product, user, session)
+    return await update_product_by_id(request, product_id, updated_product, user, session)
@@ -1,57 +1,99 @@
 from datetime import datetime
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, Request, HTTPException, Body, Query
 from fastapi.encoders import jsonable_encoder
 
 from models.category import Category
 from routers.auth.auth_bearer import JWTBearer
-from utils import to_slug
-from sqlalchemy import select, insert, update, delete, func
+from utils import to_slug, columns_for, get_list_from_result
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import LIMIT
-from models.base import get_async_session
+from models.base import get_async_session, get_read_session
 from models.product import ProductCategories, ProductTags, Product
 from models.tag import Tag
 from models.user import User
-from routers.products.products import get_product_by_slug
-from schemas.tag import TagCreate, TagUpdate
+from routers.products.entity_cache import tag_cache
+from routers.products.filters import search_by_name
+from routers.products.pagination import sort_keys, paginate, page_response, order_by_sort
+from routers.products.products import get_product_id_by_slug
+from schemas.page import Page
+from schemas.tag import TagCreate, TagUpdate, TagRead
+from services.invalidation import invalidator
+from services.json_response import FastJSONResponse
+from services.response_cache import add_surrogate_keys, set_last_modified
 
 router = APIRouter(
     prefix="/tags",
     tags=['tag']
 )
 
+TAG_COLUMNS = columns_for(Tag, TagRead)
+TAG_SORT_KEYS = sort_keys(Tag.id, tag_name=Tag.tag_name)
 
-@router.get("/id/{tag_id}")
-async def get_tag_by_id(tag_id: int, session: AsyncSession = Depends(get_async_session)):
-    query = select(Tag).where(Tag.id == tag_id)
-    result = await session.execute(query)
-
-    return jsonable_encoder(result.first()[0])
 
+@router.get("/id/{tag_id}")
+async def get_tag_by_id(tag_id: int, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        query = select(*TAG_COLUMNS).where(Tag.id == tag_id)
+        result = await session.execute(query)
+        end = result.first()
 
-@router.get("/{tag_slug}")
-async def get_tag_by_slug(tag_slug: str, session: AsyncSession = Depends(get_async_session)):
-    query = select(Tag).where(Tag.tag_slug == tag_slug)
-    result = await session.execute(query)
+        if end is None:
+            return None
+        return dict(end._mapping)
 
-    return jsonable_encoder(result.first()[0])
+    tag = await tag_cache.get_by_id(tag_id, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("tags" if tag is None else f"tag-{tag['id']}")
+    if tag is not None:
+        set_last_modified(tag["modified_at"])
+    return tag
 
 
-@router.get("")
-async def get_tag_all(offset: int, limit: int, search_query: str = Query(default=""), session: AsyncSession = Depends(get_async_session)):
+@router.get("/{tag_slug}")
+async def get_tag_by_slug(tag_slug: str, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        query = select(*TAG_COLUMNS).where(Tag.tag_slug == tag_slug)
+        result = await session.execute(query)
+        end = result.first()
+
+        if end is None:
+            return None
+        return dict(end._mapping)
+
+    tag = await tag_cache.get_by_slug(tag_slug, load)
+    # a miss can turn into a hit once something is created or becomes visible
+    add_surrogate_keys("tags" if tag is None else f"tag-{tag['id']}")
+    if tag is not None:
+        set_last_modified(tag["modified_at"])
+    return tag
+
+
+@router.get("", response_model=Union[Page[TagRead], List[TagRead]], response_class=FastJSONResponse)
+async def get_tag_all(limit: int, offset: Optional[int] = None, after: Optional[str] = None, sort: str = "id",
+                      search_query: str = Query(default=""), session: AsyncSession = Depends(get_read_session)):
     if limit > LIMIT:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    query = select(Tag).offset(offset).limit(limit).where(func.lower(Tag.tag_name).contains(search_query.lower()))
+    query = select(*TAG_COLUMNS)
+    query = search_by_name(query, Tag.tag_name, search_query)
+
+    if offset is not None:
+        query = order_by_sort(query, TAG_SORT_KEYS, sort, Tag.id).offset(offset).limit(limit)
+    else:
+        query = paginate(query, TAG_SORT_KEYS, sort, after, limit, Tag.id, search_query)
+
     result = await session.execute(query)
 
-    list = []
-    for key, tag in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(tag[0]))
+    list = get_list_from_result(result)
 
-    return list
+    if offset is not None:
+        return FastJSONResponse(list)
+    return FastJSONResponse(page_response(list, TAG_SORT_KEYS, sort, limit))
 
 
 @router.post("/create")
@@ -69,8 +111,9 @@ async def create_tag(request: Request,
     if len(result) != 0:
         return {"status": "failure", "detail": "slug is already exists"}
 
-    statement = insert(Tag).values(**new_tag.dict(), tag_slug=slug)
-    await session.execute(statement)
+    statement = insert(Tag).values(**new_tag.dict(), tag_slug=slug).returning(Tag.id)
+    tag_id = (await session.execute(statement)).scalar_one()
+    await invalidator.publish(session, "tag", tag_id)
     await session.commit()
 
     return {"status": "success"}
@@ -105,6 +148,7 @@ async def update_tag_by_id(request: Request,
                                                            created_at=result[0].created_at,
                                                            modified_at=datetime.utcnow())
     await session.execute(statement)
+    await invalidator.publish(session, "tag", tag_id)
     await session.commit()
 
     return {"status": "success"}
@@ -133,11 +177,13 @@ async def add_tag_to_product_by_id(request: Request,
     if not user.is_superuser:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    statement = insert(ProductTags).values({
+    # adding an existing link again is a no-op instead of a duplicate row
+    statement = pg_insert(ProductTags).values({
         "tag_id": tag_id,
         "product_id": product_id
-    })
+    }).on_conflict_do_nothing(index_elements=["product_id", "tag_id"])
     await session.execute(statement)
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -153,9 +199,11 @@ async def add_tag_to_product_by_slug(request: Request,
         raise HTTPException(status_code=403, detail="Forbidden")
 
     tag = await get_tag_by_slug(tag_slug, session)
-    product = await get_product_by_slug(product_slug, session)
+    if tag is None:
+        raise HTTPException(status_code=400, detail="Tag doesn't exist!")
+    product_id = await get_product_id_by_slug(product_slug, session)
 
-    return await add_tag_to_product_by_id(request, product["id"], tag["id"], user, session)
+    return await add_tag_to_product_by_id(request, product_id, tag["id"], user, session)
 
 
 @router.delete("/id/{product_id}/remove/{tag_id}")
@@ -171,6 +219,7 @@ async def remove_tag_from_product_by_id(request: Request,
         ProductCategories.category_id == tag_id and
         ProductCategories.product_id == product_id)
     await session.execute(statement)
+    await invalidator.publish(session, "product", product_id)
     await session.commit()
 
     return {"status": "success"}
@@ -186,16 +235,18 @@ async def remove_tag_to_product_by_slug(request: Request,
         raise HTTPException(status_code=403, detail="Forbidden")
 
     tag = await get_tag_by_slug(tag_slug, session)
-    product = await get_product_by_slug(product_slug, session)
+    if tag is None:
+        raise HTTPException(status_code=400, detail="Tag doesn't exist!")
+    product_id = await get_product_id_by_slug(product_slug, session)
 
-    return await remove_tag_from_product_by_id(request, product["id"], tag["id"], user, session)
+    return await remove_tag_from_product_by_id(request, product_id, tag["id"], user, session)
 
 
-@router.get("/in/{category_slug}")
+@router.get("/in/{category_slug}", response_model=List[TagRead], response_class=FastJSONResponse)
 async def get_tags_of_category(
         category_slug: str,
         session: AsyncSession = Depends(JWTBearer())):
-    query = select(Tag) \
+    query = select(*TAG_COLUMNS) \
         .distinct() \
         .join(ProductTags, Tag.id == ProductTags.tag_id) \
         .join(Product, Product.id == ProductTags.product_id) \
@@ -205,8 +256,4 @@ async def get_tags_of_category(
         .distinct()
     result = await session.execute(query)
 
-    list = []
-    for key, tag in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(tag[0]))
-
-    return list
+    return FastJSONResponse(get_list_from_result(result))
@@ -1,4 +1,6 @@
-from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -12,3 +14,35 @@ class CartProductCreate(BaseModel):
 class CartProductUpdate(BaseModel):
     quantity: Optional[int]
 
+
+class CartProductRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    user_id: int
+    product_id: int
+    quantity: int
+
+
+class CartLineRead(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+
+    product_name: str
+    product_slug: str
+    image_path: str
+    price: Decimal
+    measure: str
+    product_weight: Decimal
+
+    # available, low_stock (fewer in stock than in the cart), out_of_stock or hidden
+    status: str
+    line_total: Decimal
+
+
+class CartRead(BaseModel):
+    items: List[CartLineRead]
+    # of the lines that can be ordered, i.e. not out_of_stock or hidden
+    total: Decimal
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 from typing import Optional
 
@@ -20,3 +22,20 @@ class CategoryUpdate(BaseModel):
     image_path: Optional[str]
 
     category_description: Optional[str]
+
+
+class CategoryRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    visible: Optional[bool]
+
+    parent_id: int
+    heading_id: int
+
+    category_name: str
+    category_slug: str
+    image_path: str
+
+    category_description: str
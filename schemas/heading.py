@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 from typing import Optional
 
@@ -18,3 +20,17 @@ class HeadingUpdate(BaseModel):
     image_path: Optional[str]
 
     heading_description: Optional[str]
+
+
+class HeadingRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    visible: Optional[bool]
+
+    heading_name: str
+    heading_slug: str
+    image_path: str
+
+    heading_description: str
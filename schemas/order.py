@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class OrderRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    active: Optional[bool]
+
+    order_number: str
+
+    user_id: Optional[int]
+    mobile_phone: str
@@ -1,4 +1,6 @@
-from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -26,3 +28,29 @@ class ProductUpdate(BaseModel):
     price: Optional[float]
     quantity: Optional[int]
     product_weight: Optional[int]
+
+
+# only id is always there, lists leave out product_description and take a sparse fieldset (fields=)
+class ProductRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    visible: Optional[bool]
+
+    product_name: Optional[str]
+    product_slug: Optional[str]
+    image_path: Optional[str]
+
+    short_description: Optional[str]
+    product_description: Optional[str]
+
+    price: Optional[Decimal]
+    quantity: Optional[int]
+    measure: Optional[str]
+    product_weight: Optional[Decimal]
+
+
+class ProductBatch(BaseModel):
+    ids: Optional[List[int]]
+    slugs: Optional[List[str]]
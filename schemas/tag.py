@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -11,3 +12,13 @@ class TagCreate(BaseModel):
 class TagUpdate(BaseModel):
     tag_name: Optional[str]
     image_path: Optional[str]
+
+
+class TagRead(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    modified_at: Optional[datetime]
+
+    tag_name: str
+    tag_slug: str
+    image_path: str
@@ -71,3 +71,18 @@ class UserLoginSchema(BaseModel):
                 "password": "password"
             }
         }
+
+
+class UserAuthenticated(BaseModel):
+    """What JWTBearer resolves a token to, a snapshot that is safe to cache and share between requests."""
+    id: int
+    mobile_phone: str
+
+    first_name: str
+    last_name: str
+
+    is_verified: bool
+    is_superuser: bool
+
+    class Config:
+        allow_mutation = False
@@ -0,0 +1,126 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Sequence
+
+
+class TTLCache:
+    """Size bounded LRU with a per entry time to live, for single event loop use."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EntityCache:
+    """Encoded rows by id, with a slug -> id index next to it.
+
+    Misses are not cached. A load that raced with an invalidation is not stored,
+    so a write can't be undone by a read that started before it.
+    """
+
+    def __init__(self, slug_field: str, maxsize: int, ttl: float):
+        self.slug_field = slug_field
+
+        self._by_id = TTLCache(maxsize, ttl)
+        self._ids = TTLCache(maxsize, ttl)
+        self._generation = 0
+
+    def _store(self, entity: dict, generation: int):
+        if generation == self._generation:
+            self._by_id.set(entity["id"], entity)
+            self._ids.set(entity[self.slug_field], entity["id"])
+
+    async def get_by_id(self, entity_id: int, load: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        entity = self._by_id.get(entity_id)
+        if entity is None:
+            generation = self._generation
+            entity = await load()
+            if entity is None:
+                return None
+            self._store(entity, generation)
+
+        return dict(entity)
+
+    def _cached_by_slug(self, slug: str) -> Optional[dict]:
+        entity_id = self._ids.get(slug)
+        entity = self._by_id.get(entity_id) if entity_id is not None else None
+        # the index may still point at an entity that has been renamed since
+        if entity is None or entity[self.slug_field] != slug:
+            return None
+        return entity
+
+    async def get_by_slug(self, slug: str, load: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        entity = self._cached_by_slug(slug)
+        if entity is None:
+            generation = self._generation
+            entity = await load()
+            if entity is None:
+                return None
+            self._store(entity, generation)
+
+        return dict(entity)
+
+    async def get_many(self, keys: Sequence[Hashable], by_slug: bool,
+                       load_many: Callable[[List[Hashable]], Awaitable[List[dict]]]) -> List[Optional[dict]]:
+        """Entities by id (or slug) in the order of keys, None where missing.
+
+        Everything not cached is loaded with a single load_many(missing_keys) call,
+        which returns the entities it found in any order.
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            entity = self._cached_by_slug(key) if by_slug else self._by_id.get(key)
+            if entity is not None:
+                found[key] = entity
+            elif key not in missing:
+                missing.append(key)
+
+        if missing:
+            generation = self._generation
+            for entity in await load_many(missing):
+                self._store(entity, generation)
+                found[entity[self.slug_field] if by_slug else entity["id"]] = entity
+
+        return [dict(found[key]) if key in found else None for key in keys]
+
+    def invalidate(self, *entity_ids: int):
+        """Drops the given ids (their slugs go with them), or everything when called without any."""
+        self._generation += 1
+
+        if not entity_ids:
+            self._by_id.clear()
+            self._ids.clear()
+        for entity_id in entity_ids:
+            self._by_id.delete(entity_id)
@@ -0,0 +1,59 @@
+import logging
+
+import httpx
+
+from config import RECAPTCHA_SECRET_KEY, CAPTCHA_VERIFIER, CAPTCHA_FAIL_OPEN, CAPTCHA_TIMEOUT
+from services.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class RecaptchaVerifier:
+    """Checks tokens against Google with a strict timeout.
+
+    Every check goes to Google, which rejects a token seen before, so one solved
+    captcha can't be replayed for more OTP sends. When Google can't be reached
+    the result is fail_open.
+    """
+
+    url = "https://www.google.com/recaptcha/api/siteverify"
+
+    def __init__(self, secret: str, fail_open: bool, timeout: float):
+        self.secret = secret
+        self.fail_open = fail_open
+        self.timeout = timeout
+
+    async def verify(self, host: str, captcha: str) -> bool:
+        data = {
+            'secret': self.secret,
+            'response': captcha,
+            'remoteip': host
+        }
+
+        try:
+            response = await get_http_client().post(self.url, data=data, timeout=self.timeout)
+            status = response.json().get("success", False)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Captcha verification unavailable: %r", e)
+            return self.fail_open
+
+        return status
+
+
+class StubVerifier:
+    """Answers without calling Google, for tests and local runs."""
+
+    def __init__(self, result: bool = True):
+        self.result = result
+
+    async def verify(self, host: str, captcha: str) -> bool:
+        return self.result
+
+
+def create_verifier():
+    if CAPTCHA_VERIFIER == "stub":
+        return StubVerifier()
+    return RecaptchaVerifier(RECAPTCHA_SECRET_KEY, CAPTCHA_FAIL_OPEN, CAPTCHA_TIMEOUT)
+
+
+captcha_verifier = create_verifier()
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from fastapi import HTTPException
+
+from services.cache import TTLCache
+from services.response_cache import mark_stale
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescedValue:
+    def __init__(self, value: Any, fresh_until: float, generation: int):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.generation = generation
+
+
+class Coalescer:
+    """Single flight and stale-while-revalidate in front of expensive reads.
+
+    Concurrent callers of the same key share one in-flight call. A value past its
+    fresh time but still within the stale window is returned right away while a single
+    background call refreshes it. invalidate() makes every value stale, so after a write
+    the old value is served while one refresh runs instead of every caller querying.
+    """
+
+    def __init__(self, maxsize: int):
+        self._values = TTLCache(maxsize, ttl=0)
+        self._inflight: Dict[Tuple[Hashable, int], asyncio.Task] = {}
+        self._generation = 0
+
+    def invalidate(self, *keys):
+        self._generation += 1
+
+    async def get(self, key: Hashable, factory: Callable[[], Awaitable[Any]], fresh: float, stale: float) -> Any:
+        """factory runs outside of the calling request, it has to open its own session."""
+        entry = self._values.get(key)
+        if entry is None:
+            return await asyncio.shield(self._refresh(key, factory, fresh, stale))
+
+        if entry.generation != self._generation or entry.fresh_until <= time.monotonic():
+            self._refresh(key, factory, fresh, stale)
+            mark_stale()
+
+        return entry.value
+
+    def _refresh(self, key: Hashable, factory: Callable[[], Awaitable[Any]], fresh: float, stale: float):
+        flight = (key, self._generation)
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.create_task(self._run(key, factory, fresh, stale, self._generation))
+            task.add_done_callback(lambda done: self._done(flight, done))
+            self._inflight[flight] = task
+        return task
+
+    def _done(self, flight: Tuple[Hashable, int], task: asyncio.Task):
+        self._inflight.pop(flight, None)
+        if not task.cancelled() and task.exception() is not None \
+                and not isinstance(task.exception(), HTTPException):
+            logger.warning("Refreshing %r failed: %r", flight[0], task.exception())
+
+    async def _run(self, key: Hashable, factory: Callable[[], Awaitable[Any]], fresh: float, stale: float,
+                   generation: int) -> Any:
+        value = await factory()
+
+        # invalidated meanwhile, it is kept under the old generation and served stale
+        self._values.set(key, CoalescedValue(value, time.monotonic() + fresh, generation), ttl=fresh + stale)
+        return value
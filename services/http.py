@@ -0,0 +1,28 @@
+from typing import Optional
+
+import httpx
+
+from config import HTTP_TIMEOUT
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Process wide connection pooled client for calls to third party APIs."""
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10)
+        )
+
+    return _client
+
+
+async def close_http_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
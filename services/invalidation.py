@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DB_LISTEN_HOST, DB_LISTEN_PORT, DB_NAME, DB_PASS, DB_USER, INVALIDATION_RECONNECT_DELAY
+from models.base import replicas
+from models.catalog_version import CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+
+
+class Invalidator:
+    """Keeps the in-process caches of all workers coherent over Postgres LISTEN/NOTIFY.
+
+    publish() applies an invalidation locally right away and sends a NOTIFY in the caller's
+    transaction, so every worker (this one again too) applies it once the write commits.
+    Messages sent while the listener is disconnected are lost, so on (re)connect all
+    subscribers are told to drop everything.
+
+    Every publish also bumps the kind's row in catalog_version. versions only takes the
+    committed numbers (loaded on connect, then from the notifications), so all workers
+    agree on them and they can go into ETags.
+    """
+
+    def __init__(self, channel: str, reconnect_delay: float):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+
+        self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+
+        # None until the listener has loaded them, nothing can be stamped before that
+        self.versions: Optional[Dict[str, int]] = None
+        self._notified: Dict[str, int] = {}
+
+    def subscribe(self, kind: str, callback: Callable):
+        """callback(*keys) is called for every invalidation of kind, without keys it should drop everything."""
+        self._subscribers[kind].append(callback)
+
+    def apply(self, kind: str, keys: list):
+        # the caches are refilled from the primary, a lagging replica would put the old rows back
+        replicas.avoid_for_max_lag()
+
+        for callback in self._subscribers.get(kind, []):
+            try:
+                callback(*keys)
+            except Exception:
+                logger.exception("Invalidation of %s %s failed", kind, keys)
+
+    def apply_all(self):
+        for kind in list(self._subscribers):
+            self.apply(kind, [])
+
+    async def publish(self, session: AsyncSession, kind: str, *keys):
+        self.apply(kind, list(keys))
+
+        statement = pg_insert(CatalogVersion).values(kind=kind, version=1) \
+            .on_conflict_do_update(index_elements=[CatalogVersion.kind],
+                                   set_={"version": CatalogVersion.version + 1}) \
+            .returning(CatalogVersion.version)
+        version = (await session.execute(statement)).scalar_one()
+
+        payload = json.dumps({"kind": kind, "keys": list(keys), "version": version})
+        await session.execute(select(func.pg_notify(self.channel, payload)))
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Bad invalidation message: %r", payload)
+            return
+
+        kind = message["kind"]
+        self._notified[kind] = max(self._notified.get(kind, 0), message.get("version", 0))
+        if self.versions is not None:
+            self.versions[kind] = self._notified[kind]
+
+        self.apply(kind, message["keys"])
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(host=DB_LISTEN_HOST, port=DB_LISTEN_PORT, user=DB_USER,
+                                                   password=DB_PASS, database=DB_NAME)
+
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                self._notified = {}
+                await connection.add_listener(self.channel, self._on_notify)
+
+                # a notification can arrive while this runs and be newer than what it read
+                rows = await connection.fetch("SELECT kind, version FROM catalog_version")
+                versions = {row["kind"]: row["version"] for row in rows}
+                for kind, version in self._notified.items():
+                    versions[kind] = max(versions.get(kind, 0), version)
+                self.versions = versions
+                self.apply_all()
+                await closed.wait()
+                logger.warning("Invalidation listener disconnected")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Invalidation listener failed")
+            finally:
+                self.versions = None
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(self.reconnect_delay)
+
+
+invalidator = Invalidator(CHANNEL, INVALIDATION_RECONNECT_DELAY)
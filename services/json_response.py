@@ -0,0 +1,22 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def encode_default(value):
+    """Types orjson doesn't handle itself. Decimal as jsonable_encoder did it, whole numbers as int."""
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson rendering of plain dicts and lists.
+
+    Returned directly from a route it also skips FastAPI's validation and jsonable_encoder,
+    so list routes build their rows with get_list_from_result() and return one of these.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
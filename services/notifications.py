@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import TELEGRAM_API_KEY, TELEGRAM_CHAT_ID, NOTIFICATION_TRANSPORT, NOTIFICATION_BATCH_SIZE, \
+    NOTIFICATION_POLL_INTERVAL, NOTIFICATION_MAX_ATTEMPTS, NOTIFICATION_RATE_PER_SECOND, NOTIFICATION_LEASE
+from models.base import async_session_maker
+from models.notification import Notification
+from services.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 60 * 60
+
+
+class TelegramTransport:
+    async def send(self, text: str):
+        url = f"https://api.telegram.org/bot{TELEGRAM_API_KEY}/sendMessage"
+        params = {
+            "chat_id": TELEGRAM_CHAT_ID,
+            "text": text,
+        }
+
+        response = await get_http_client().get(url, params=params)
+        response.raise_for_status()
+
+
+class StubTransport:
+    """Keeps messages in memory instead of sending them, for tests and local runs."""
+
+    def __init__(self):
+        self.sent: List[str] = []
+
+    async def send(self, text: str):
+        self.sent.append(text)
+
+
+def create_transport():
+    if NOTIFICATION_TRANSPORT == "stub":
+        return StubTransport()
+    return TelegramTransport()
+
+
+async def enqueue_notification(session: AsyncSession, text: str, channel: str = "telegram"):
+    """Writes the message to the outbox in the caller's transaction, it is sent once that commits."""
+    await session.execute(insert(Notification).values(channel=channel, payload=text))
+
+
+class NotificationDispatcher:
+    """Background task draining the outbox: batched, rate limited, retried with exponential backoff.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED and leased for lease seconds, so several workers
+    can run it side by side. The lease has to outlast sending a whole batch at the rate limit.
+    """
+
+    def __init__(self, transport, batch_size: int, poll_interval: float, max_attempts: int, rate_per_second: float,
+                 lease: float):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.send_interval = 1 / rate_per_second if rate_per_second > 0 else 0
+        self.lease = lease
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._next_send_at = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Skips the rest of the poll interval, called after a transaction with new messages commits."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await self.dispatch_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                sent = 0
+
+            # a full batch means there is probably more waiting
+            if sent >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _throttle(self):
+        delay = self._next_send_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send_at = time.monotonic() + self.send_interval
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(2 ** attempts, MAX_BACKOFF))
+
+    async def _claim(self) -> list:
+        """Leases a batch in a short transaction of its own, by moving next_attempt_at past the sends.
+
+        Other workers skip leased rows, and if this one dies before marking them they are
+        picked up again once the lease runs out.
+        """
+        now = datetime.utcnow()
+
+        async with async_session_maker() as session:
+            claimable = select(Notification.id) \
+                .where(Notification.sent_at.is_(None)) \
+                .where(Notification.failed.is_(False)) \
+                .where(Notification.next_attempt_at <= now) \
+                .order_by(Notification.id) \
+                .limit(self.batch_size) \
+                .with_for_update(skip_locked=True)
+
+            statement = update(Notification) \
+                .where(Notification.id.in_(claimable.scalar_subquery())) \
+                .values(next_attempt_at=now + timedelta(seconds=self.lease), modified_at=now) \
+                .returning(Notification.id, Notification.payload, Notification.attempts)
+            notifications = (await session.execute(statement)).all()
+            await session.commit()
+
+        return sorted(notifications, key=lambda notification: notification.id)
+
+    async def _mark(self, notification_id: int, **values):
+        async with async_session_maker() as session:
+            statement = update(Notification).where(Notification.id == notification_id) \
+                .values(**values, modified_at=datetime.utcnow())
+            await session.execute(statement)
+            await session.commit()
+
+    async def dispatch_batch(self) -> int:
+        notifications = await self._claim()
+
+        # no transaction is open while sending, every result is written on its own right after
+        for notification in notifications:
+            await self._throttle()
+
+            try:
+                await self.transport.send(notification.payload)
+            except Exception as e:
+                attempts = notification.attempts + 1
+                logger.warning("Notification %s failed (attempt %s): %r", notification.id, attempts, e)
+
+                await self._mark(notification.id, attempts=attempts, last_error=repr(e),
+                                 next_attempt_at=datetime.utcnow() + self._backoff(attempts),
+                                 failed=attempts >= self.max_attempts)
+            else:
+                await self._mark(notification.id, sent_at=datetime.utcnow())
+
+        return len(notifications)
+
+notification_dispatcher = NotificationDispatcher(create_transport(), NOTIFICATION_BATCH_SIZE,
+                                                 NOTIFICATION_POLL_INTERVAL, NOTIFICATION_MAX_ATTEMPTS,
+                                                 NOTIFICATION_RATE_PER_SECOND, NOTIFICATION_LEASE)
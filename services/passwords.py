@@ -0,0 +1,96 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool instead of the event loop.
+
+    At most max_pending calls may be queued or running, further ones get a 503
+    instead of piling up behind a login storm.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.rounds = rounds
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+
+        self._calls = 0
+        self._rejected = 0
+        self._hash_seconds = 0.0
+        self._hash_seconds_max = 0.0
+        self._wait_seconds = 0.0
+        self._wait_seconds_max = 0.0
+
+    async def _run(self, function, *args):
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, try again later!")
+
+        def timed():
+            started_at = time.perf_counter()
+            result = function(*args)
+            return result, started_at, time.perf_counter()
+
+        self._pending += 1
+        queued_at = time.perf_counter()
+        try:
+            result, started_at, finished_at = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+
+        wait_seconds = started_at - queued_at
+        hash_seconds = finished_at - started_at
+
+        self._calls += 1
+        self._wait_seconds += wait_seconds
+        self._wait_seconds_max = max(self._wait_seconds_max, wait_seconds)
+        self._hash_seconds += hash_seconds
+        self._hash_seconds_max = max(self._hash_seconds_max, hash_seconds)
+
+        return result
+
+    async def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), salt)
+
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        try:
+            return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+        except ValueError:
+            # not a bcrypt hash, e.g. the placeholder of a user that never finished registration
+            return False
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        try:
+            return int(hashed_password.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def metrics(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "calls": self._calls,
+            "rejected": self._rejected,
+            "hash_seconds_avg": self._hash_seconds / self._calls if self._calls else 0,
+            "hash_seconds_max": self._hash_seconds_max,
+            "wait_seconds_avg": self._wait_seconds / self._calls if self._calls else 0,
+            "wait_seconds_max": self._wait_seconds_max,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher(BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,299 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qsl, urlencode
+
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BODY, RESPONSE_CACHE_MAX_AGE, \
+    ETAG_VERSION
+from services.cache import TTLCache
+from services.invalidation import invalidator
+
+
+class ResponseMarks:
+    def __init__(self):
+        self.surrogate_keys: Set[str] = set()
+        self.stale = False
+        self.last_modified: Optional[datetime] = None
+
+    def is_cacheable(self) -> bool:
+        return bool(self.surrogate_keys) and not self.stale
+
+
+_marks: ContextVar[Optional[ResponseMarks]] = ContextVar("response_marks", default=None)
+
+
+def add_surrogate_keys(*keys: str):
+    """Marks the GET response being built as cacheable, its copy is dropped when any of the keys is purged."""
+    marks = _marks.get()
+    if marks is not None:
+        marks.surrogate_keys.update(keys)
+
+
+def set_last_modified(modified_at: Union[datetime, str, None]):
+    """Last-Modified of the response being built, the newest of all values set wins (naive values are UTC)."""
+    marks = _marks.get()
+    if marks is None or modified_at is None:
+        return
+
+    if isinstance(modified_at, str):
+        modified_at = datetime.fromisoformat(modified_at)
+    if modified_at.tzinfo is None:
+        modified_at = modified_at.replace(tzinfo=timezone.utc)
+
+    # HTTP dates have no fractions of a second
+    modified_at = modified_at.replace(microsecond=0)
+    if marks.last_modified is None or modified_at > marks.last_modified:
+        marks.last_modified = modified_at
+
+
+def mark_stale():
+    """The response being built may be out of date, it is sent but not cached here or by the proxy."""
+    marks = _marks.get()
+    if marks is not None:
+        marks.stale = True
+
+
+class CachedResponse:
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, keys: Set[str], stamp: int,
+                 etag: Optional[bytes], last_modified: Optional[datetime]):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.keys = keys
+        self.stamp = stamp
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache:
+    """Serialized responses by path and normalized query, purged by surrogate key.
+
+    Every purge bumps a counter and remembers it for the purged keys. An entry is only
+    valid while none of its keys were purged after the request that built it started,
+    so purging is O(keys) and a response computed concurrently with a purge is never served.
+
+    ETags come from the catalog versions (invalidator.versions) of the kinds behind a
+    response's surrogate keys, not from its body. The kinds seen per URL are kept longer
+    than the responses, so a matching If-None-Match is answered without running the handler.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._purged_at: Dict[str, int] = {}
+        self._cleared_at = 0
+        self._counter = 0
+
+        self._list_kinds: Dict[str, str] = {}
+        self._url_kinds = TTLCache(maxsize, ttl=24 * 60 * 60)
+
+    def register_kind(self, kind: str, list_key: str):
+        """Surrogate keys of kind are list_key and f"{kind}-{id}"."""
+        self._list_kinds[list_key] = kind
+
+    def kinds_of(self, keys: Set[str]) -> frozenset:
+        return frozenset(self._list_kinds.get(key, key.split("-", 1)[0]) for key in keys)
+
+    def etag(self, kinds: frozenset, versions: Optional[Dict[str, int]]) -> Optional[bytes]:
+        if versions is None or not kinds:
+            return None
+
+        stamp = "-".join(f"{kind}.{versions.get(kind, 0)}" for kind in sorted(kinds))
+        return f'W/"{ETAG_VERSION}-{stamp}"'.encode()
+
+    def remember_kinds(self, key: str, kinds: frozenset):
+        self._url_kinds.set(key, kinds)
+
+    def known_kinds(self, key: str) -> Optional[frozenset]:
+        return self._url_kinds.get(key)
+
+    def stamp(self) -> int:
+        return self._counter
+
+    def _is_valid(self, keys: Set[str], stamp: int) -> bool:
+        if stamp < self._cleared_at:
+            return False
+        return all(self._purged_at.get(key, 0) <= stamp for key in keys)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if not self._is_valid(entry.keys, entry.stamp):
+            self._entries.delete(key)
+            return None
+        return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        if self._is_valid(entry.keys, entry.stamp):
+            self._entries.set(key, entry)
+
+    def purge(self, *keys: str):
+        self._counter += 1
+        for key in keys:
+            self._purged_at[key] = self._counter
+
+    def purge_all(self):
+        self._counter += 1
+        self._cleared_at = self._counter
+        self._purged_at.clear()
+        self._entries.clear()
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def cache_key(scope) -> str:
+    query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+    return f"{scope['path']}?{urlencode(sorted(query))}"
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """Weak comparison against an If-None-Match list."""
+    if if_none_match.strip() == b"*":
+        return True
+
+    def opaque(tag: bytes) -> bytes:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith(b"W/") else tag
+
+    return opaque(etag) in [opaque(tag) for tag in if_none_match.split(b",")]
+
+
+def is_not_modified(request_headers: Dict[bytes, bytes], etag: Optional[bytes],
+                    last_modified: Optional[datetime]) -> bool:
+    if_none_match = request_headers.get(b"if-none-match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    if_modified_since = request_headers.get(b"if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since.decode("latin-1"))
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+class ResponseCacheMiddleware:
+    """Serves repeated GETs from response_cache and answers conditional requests with 304.
+
+    Only responses whose handler called add_surrogate_keys() are cached, they also get
+    Cache-Control and Surrogate-Key headers so a front proxy can keep them as well, and
+    an ETag (plus Last-Modified when the handler set one). Stale responses get none of it.
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        key = cache_key(scope)
+        request_headers = dict(scope["headers"])
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            if is_not_modified(request_headers, entry.etag, entry.last_modified):
+                await self._send_not_modified(send, entry.keys, entry.etag, entry.last_modified)
+            else:
+                await self._send_cached(send, entry)
+            return
+
+        # versions taken before the handler reads anything, a write committed meanwhile changes the next ETag
+        versions = dict(invalidator.versions) if invalidator.versions is not None else None
+
+        kinds = self.cache.known_kinds(key)
+        if kinds is not None and b"if-none-match" in request_headers:
+            etag = self.cache.etag(kinds, versions)
+            if etag is not None and etag_matches(request_headers[b"if-none-match"], etag):
+                await self._send_not_modified(send, set(), etag, None)
+                return
+
+        marks = ResponseMarks()
+        stamp = self.cache.stamp()
+        token = _marks.set(marks)
+
+        state = {"status": None, "headers": None, "body": [], "size": 0, "complete": False,
+                 "etag": None, "not_modified": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if marks.is_cacheable() and message["status"] == 200:
+                    kinds = self.cache.kinds_of(marks.surrogate_keys)
+                    self.cache.remember_kinds(key, kinds)
+                    state["etag"] = self.cache.etag(kinds, versions)
+
+                    state["headers"] = [(name, value) for name, value in message.get("headers", [])
+                                        if name.lower() not in (b"cache-control", b"surrogate-key", b"etag",
+                                                                b"last-modified")]
+                    if marks.last_modified is not None:
+                        last_modified = format_datetime(marks.last_modified, usegmt=True).encode()
+                        state["headers"].append((b"last-modified", last_modified))
+
+                    if is_not_modified(request_headers, state["etag"], marks.last_modified):
+                        state["not_modified"] = True
+                        await self._send_not_modified(send, marks.surrogate_keys, state["etag"],
+                                                      marks.last_modified, body=False)
+                        return
+
+                    cache_headers = self._cache_headers(marks.surrogate_keys, state["etag"], b"MISS")
+                    message = {**message, "headers": state["headers"] + cache_headers}
+            elif message["type"] == "http.response.body" and state["headers"] is not None:
+                body = message.get("body", b"")
+                state["size"] += len(body)
+                if state["size"] <= RESPONSE_CACHE_MAX_BODY:
+                    state["body"].append(body)
+                state["complete"] = not message.get("more_body", False)
+
+                if state["not_modified"]:
+                    if state["complete"]:
+                        await send({"type": "http.response.body", "body": b""})
+                    return
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            _marks.reset(token)
+
+        if state["headers"] is not None and state["complete"] and state["size"] <= RESPONSE_CACHE_MAX_BODY:
+            self.cache.set(key, CachedResponse(state["status"], state["headers"], b"".join(state["body"]),
+                                               marks.surrogate_keys, stamp, state["etag"], marks.last_modified))
+
+    def _cache_headers(self, surrogate_keys: Set[str], etag: Optional[bytes],
+                       status: bytes) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"cache-control", f"public, max-age={RESPONSE_CACHE_MAX_AGE}".encode()),
+            (b"x-cache", status),
+        ]
+        if surrogate_keys:
+            headers.append((b"surrogate-key", " ".join(sorted(surrogate_keys)).encode()))
+        if etag is not None:
+            headers.append((b"etag", etag))
+        return headers
+
+    async def _send_cached(self, send, entry: CachedResponse):
+        await send({
+            "type": "http.response.start",
+            "status": entry.status,
+            "headers": entry.headers + self._cache_headers(entry.keys, entry.etag, b"HIT"),
+        })
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _send_not_modified(self, send, surrogate_keys: Set[str], etag: Optional[bytes],
+                                 last_modified: Optional[datetime], body: bool = True):
+        headers = self._cache_headers(surrogate_keys, etag, b"REVALIDATED")
+        if last_modified is not None:
+            headers.append((b"last-modified", format_datetime(last_modified, usegmt=True).encode()))
+
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        if body:
+            await send({"type": "http.response.body", "body": b""})
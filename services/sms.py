@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import MOBIZON_API_KEY, SMS_TRANSPORT, SMS_QUEUE_SIZE, SMS_WORKERS, SMS_MAX_ATTEMPTS
+from services.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 60
+
+
+class MobizonTransport:
+    async def send(self, recipient: str, text: str):
+        url = "https://api.mobizon.kz/service/message/sendsmsmessage"
+        params = {
+            "recipient": recipient,
+            "text": text,
+            "apiKey": MOBIZON_API_KEY,
+        }
+
+        response = await get_http_client().get(url, params=params)
+        response.raise_for_status()
+
+        code = response.json().get("code")
+        if code != 0:
+            raise RuntimeError(f"Mobizon error code {code}")
+
+
+class FakeTransport:
+    """Keeps messages in memory instead of sending them, for tests and local runs."""
+
+    def __init__(self):
+        self.sent: List[Tuple[str, str]] = []
+
+    async def send(self, recipient: str, text: str):
+        self.sent.append((recipient, text))
+
+
+def create_transport():
+    if SMS_TRANSPORT == "fake":
+        return FakeTransport()
+    return MobizonTransport()
+
+
+class SmsMessage:
+    def __init__(self, recipient: str, text: str):
+        self.recipient = recipient
+        self.text = text
+        self.attempts = 0
+
+
+class SmsQueue:
+    """Bounded in-process queue with a few sender workers.
+
+    A message still waiting for a recipient is replaced by the newer one instead of
+    queueing both. Messages that keep failing end up in dead_letters.
+    """
+
+    def __init__(self, transport, maxsize: int, workers: int, max_attempts: int):
+        self.transport = transport
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_attempts = max_attempts
+
+        self.dead_letters: Deque[SmsMessage] = deque(maxlen=100)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, SmsMessage] = {}
+
+    def start(self):
+        if not self._tasks:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, recipient: str, text: str):
+        """Raises 503 when the queue is full, call it before committing whatever the text refers to."""
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="SMS service is not running!")
+
+        pending = self._pending.get(recipient)
+        if pending is not None:
+            pending.text = text
+            return
+
+        message = SmsMessage(recipient, text)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="SMS service is busy, try again later!")
+
+        self._pending[recipient] = message
+
+    def _retry(self, message: SmsMessage):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if self._pending.get(message.recipient) is message:
+                del self._pending[message.recipient]
+            self._dead_letter(message, "queue is full")
+
+    def _dead_letter(self, message: SmsMessage, reason: str):
+        self.dead_letters.append(message)
+        logger.error("SMS to %s dropped after %s attempts: %s", message.recipient, message.attempts, reason)
+
+    async def _work(self):
+        while True:
+            message = await self._queue.get()
+            if self._pending.get(message.recipient) is message:
+                del self._pending[message.recipient]
+
+            try:
+                message.attempts += 1
+                await self.transport.send(message.recipient, message.text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if message.attempts >= self.max_attempts:
+                    self._dead_letter(message, repr(e))
+                # stays pending while waiting, unless a newer message for the number took its place
+                elif self._pending.setdefault(message.recipient, message) is message:
+                    delay = min(2 ** message.attempts, MAX_BACKOFF)
+                    asyncio.get_running_loop().call_later(delay, self._retry, message)
+            finally:
+                self._queue.task_done()
+
+
+sms_queue = SmsQueue(create_transport(), SMS_QUEUE_SIZE, SMS_WORKERS, SMS_MAX_ATTEMPTS)
+
+
+def send_otp(recipient: str, otp: int):
+    sms_queue.send(recipient, f"Ваш код верификации для thaihana.kz: {otp}")
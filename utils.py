@@ -1,41 +1,19 @@
-import requests
-from fastapi.encoders import jsonable_encoder
 import slugify
-from config import TELEGRAM_API_KEY, TELEGRAM_CHAT_ID, MOBIZON_API_KEY
-import urllib.parse
+
+
+def columns_for(model, schema, names=None) -> list:
+    """Table columns of model named like the fields of schema (only those in names if given), in the schema's order."""
+    return [model.__table__.c[name] for name in schema.__fields__ if names is None or name in names]
 
 
 def get_list_from_result(result):
+    """Rows of a select over plain columns (see columns_for) as dicts keyed by column name."""
     list = []
-    for key, product in enumerate(result.fetchall()):
-        list.append(jsonable_encoder(product[0]))
+    for row in result:
+        list.append(dict(row._mapping))
 
     return list
 
 
 def to_slug(string: str):
     return slugify.slugify(string, allow_unicode=False)
-
-
-def send_message(text):
-    token = TELEGRAM_API_KEY
-    chat_id = TELEGRAM_CHAT_ID
-
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    params = {
-        "chat_id": chat_id,
-        "text": text,
-    }
-    
-    requests.get(url, params=params)
-
-
-def send_otp(recipient: str, otp: int):
-    token = MOBIZON_API_KEY
-
-    text = f"Ваш код верификации для thaihana.kz: {otp}"
-    text = urllib.parse.quote(text)
-
-    url = f"https://api.mobizon.kz/service/message/sendsmsmessage?recipient={recipient}&text={text}&apiKey={token}"
-
-    resp = requests.get(url)